@@ -1,6 +1,7 @@
 """Custom hatch build hook"""
 import ast
 import importlib
+import importlib.util
 import inspect
 import json
 import os
@@ -10,6 +11,9 @@ from pathlib import Path
 
 from hatchling.builders.hooks.plugin.interface import BuildHookInterface
 
+# Libraries whose help() output is included in agent prompts
+DOCUMENTED_PACKAGES = ["mira", "chirho"]
+
 
 class CustomHook(BuildHookInterface):
     """The IPykernel build hook."""
@@ -61,3 +65,27 @@ class CustomHook(BuildHookInterface):
                 # Add wheel.shared-data mappings for each file so it is installed to the correct location
                 build_config["targets"]["wheel"]["shared-data"][dest_file] = f"share/beaker/{typename}/{slug}.json"
 
+
+        # Prebuild the help() documentation used in agent prompts for any documented library that is importable
+        # here. Builds in an isolated environment usually won't have them, in which case the docs are built and
+        # cached the first time a kernel needs them instead. This is only an optimisation, so nothing that goes wrong
+        # here fails the build.
+        try:
+            docs_spec = importlib.util.spec_from_file_location(
+                "askem_beaker_docs", os.path.join(here, "src", "askem_beaker", "lib", "docs.py")
+            )
+            docs = importlib.util.module_from_spec(docs_spec)
+            docs_spec.loader.exec_module(docs)
+        except Exception as e:
+            self.app.display_warning(f"Skipping prebuilt library docs: {e}")
+            return
+        docs_dest = os.path.join(dest, "docs")
+        for package in DOCUMENTED_PACKAGES:
+            try:
+                doc_path = docs.write_help_text(package, docs_dest)
+            except ImportError:
+                continue
+            except Exception as e:
+                self.app.display_warning(f"Skipping prebuilt docs for {package}: {type(e).__name__}: {e}")
+                continue
+            build_config["targets"]["wheel"]["shared-data"][doc_path] = f"share/beaker/docs/{os.path.basename(doc_path)}"
@@ -1,16 +1,17 @@
 import logging
-import contextlib
-from importlib import import_module
-import io
 import json
 from typing import TYPE_CHECKING, Any, Dict
-import pickle
 import os
 
 from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.subkernels.python import PythonSubkernel
 import pkgutil
 from .agent import ChirhoAgent #to change dynamically on new context creation
+from .lib.utils import CHROMADB_PATH, query_examples
+from askem_beaker.lib.chroma import get_chroma
+from askem_beaker.lib.docs import get_help_text
+from askem_beaker.lib.few_shot import FewShotRetriever
+from askem_beaker.lib.variable_summary import format_variables
 
 if TYPE_CHECKING:
     from beaker_kernel.kernel import LLMKernel
@@ -33,6 +34,7 @@ class ChirhoContext(BaseContext): #to change dynamically on new context creation
         self.variables={}
         self.imported_modules={}
         self.few_shot_examples=''
+        self.few_shot = FewShotRetriever(query_examples)
         self.code_blocks=[] #{'code':str,'execution_status':not_executed,executed_successfully,'execution_order':int,'output':output from running code block most recent time.}
         self.code_block_print='\n\n'.join([f'Code Block[{i}]: {self.code_blocks[i]["code"]}\nExecution Status:{self.code_blocks[i]["execution_status"]}\nExecution Order:{self.code_blocks[i]["execution_order"]}\nCode Block Output or Error:{self.code_blocks[i]["output"]}' for i in range(len(self.code_blocks))])
         self.context_conf = {
@@ -45,27 +47,24 @@ class ChirhoContext(BaseContext): #to change dynamically on new context creation
         super().__init__(beaker_kernel, self.agent_cls, config)
         if not isinstance(self.subkernel, PythonSubkernel):
             raise ValueError("This context is only valid for Python.")
+        # Load the retrieval index while the user gets started, rather than during their first agent query
+        get_chroma().warmup_in_background(CHROMADB_PATH)
         
-    async def get_jupyter_context(self):
-        imported_modules=[]
-        variables={}
-        code = self.agent.context.get_code("get_jupyter_variables")
-        await self.agent.context.evaluate(
+    async def get_jupyter_context(self, full=False):
+        code = self.agent.context.get_code("get_jupyter_variables", {"full": full})
+        response = await self.agent.context.evaluate(
             code,
             parent_header={},
         )
-        jupyter_context={'user_vars':{},'imported_modules':[]}
-        try:
-            jupyter_context=pickle.load(open('/tmp/jupyter_state.pkl', 'rb'))
-        except:
-            logger.error('failed to load jupyter_state.pkl')
+        summary = response.get("return") or {}
+        return summary.get("changed", {}), summary.get("removed", []), summary.get("imported_modules", [])
 
-        variables=jupyter_context['user_vars']
-        imported_modules=jupyter_context['imported_modules']
-        return variables,imported_modules
-    
     async def post_execute(self, message):
-        self.variables,self.imported_modules=await self.get_jupyter_context()
+        # The subkernel only reports variables that changed since the last cell, so the first call asks for all of them.
+        changed, removed, self.imported_modules = await self.get_jupyter_context(full=not self.variables)
+        self.variables.update(changed)
+        for name in removed:
+            self.variables.pop(name, None)
         self.agent.debug(event_type="update_code_env",content={
                     "variables": self.variables,
                 })
@@ -74,16 +73,13 @@ class ChirhoContext(BaseContext): #to change dynamically on new context creation
                 })
     
     async def auto_context(self):
-        from .lib.utils import query_examples 
-        most_recent_user_query=''
-        for message in self.agent.messages:
-            if message['role']=='user':
-                most_recent_user_query=message['content']
-        if most_recent_user_query!=self.agent.most_recent_user_query:
-            self.few_shot_examples=query_examples(most_recent_user_query)
+        self.few_shot_examples, retrieved = self.few_shot.examples_for(self.agent.messages)
+        if retrieved:
+            self.agent.most_recent_user_query = self.few_shot.query
             self.agent.debug(event_type="few_shot_examples",content={
                         "few_shot_examples": self.few_shot_examples,
-                        "user_query":most_recent_user_query
+                        "user_query": self.few_shot.query,
+                        **self.few_shot.stats(),
                     })
         
         intro=f"""You are an exceptionally intelligent coding assistant that consistently delivers accurate and reliable responses to user instructions.
@@ -122,8 +118,8 @@ If the request from the user is similar enough to one of these examples, use it
 {self.few_shot_examples}
 """ #to change dynamically on new context creation
 
-        code_environment=f"""These are the variables in the user's current code environment with key value pairs:
-{self.variables}
+        code_environment=f"""These are the variables in the user's current code environment, with their types and values:
+{format_variables(self.variables)}
 
 The user has also imported the following modules: {','.join(self.imported_modules)}. So you don't need to import them when generating code.
 When writing code that edits the variables that the user has in their environment be sure to modify them in place. 
@@ -147,14 +143,8 @@ Please answer any user queries or perform user instructions to the best of your
         }
         """
         documentation = {}
-        for package in self.context_conf.get('library_names', []):
-            module = import_module(package)
-
-            # Redirect the standard output to capture the help text
-            with io.StringIO() as buf, contextlib.redirect_stdout(buf):
-                help(module)
-                # Store the help text in the dictionary
-                documentation[package] = buf.getvalue()
-        print(f"Fetched help for {documentation.keys()}")
+        for package in self.context_conf.get("library_names", []):
+            # Cached by package version, so help() only runs the first time a version is seen
+            documentation[package] = get_help_text(package)
         return documentation
     
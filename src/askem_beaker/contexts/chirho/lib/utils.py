@@ -1,37 +1,29 @@
 import glob
 import json
 import logging
-import os
 
-import chromadb
-import openai
+from askem_beaker.lib.chroma import get_chroma
 
 logger = logging.getLogger(__name__)
 
+CHROMADB_PATH = "/home/jupyter/chromadb_functions_chirho"
 
-def start_chromadb(collection_name="chiro_full", path="/home/jupyter/chromadb_functions_chirho"):
-    chroma_client = chromadb.PersistentClient(path=path)
 
-    collection = chroma_client.get_or_create_collection(name=collection_name)
-
-    openai.api_key = os.environ["OPENAI_API_KEY"]
-    return collection
+def start_chromadb(collection_name="chiro_full", path=CHROMADB_PATH):
+    return get_chroma().collection(collection_name, path)
 
 
 def query_examples(query, n_results=5):
-    u_query_collection=start_chromadb(collection_name="chirho_user_queries_dev6")
-    examples_collection=start_chromadb(collection_name="chirho_examples_dev6")
-    results=u_query_collection.query(query_texts=[query],
-                    n_results=n_results)
-    examples_ids=results['ids'][0] 
-    examples=examples_collection.get(ids=examples_ids)['documents']
-    
+    chroma = get_chroma()
+    results = chroma.query("chirho_user_queries_dev6", CHROMADB_PATH, query, n_results=n_results)
+    examples_ids = results["ids"][0]
+    examples = chroma.get("chirho_examples_dev6", CHROMADB_PATH, examples_ids)["documents"]
+
     return examples
 
 
-def query_docs(query, collection_name="chiro_documentation_index", path="/home/jupyter/chromadb_functions_chirho", n_results=5):
-    collection = start_chromadb(collection_name=collecstion_name, path=path)
-    result = collection.query(query_texts=[query], n_results=n_results)
+def query_docs(query, collection_name="chiro_documentation_index", path=CHROMADB_PATH, n_results=5):
+    result = get_chroma().query(collection_name, path, query, n_results=n_results)
     text = ""
     for i in range(len(result["ids"][0])):
         text += f"Documentation from {result['ids'][0][i]} :\n{result['documents'][0][i]}"
@@ -40,10 +32,9 @@ def query_docs(query, collection_name="chiro_documentation_index", path="/home/j
 
 
 def query_functions_classes(
-    query, collection_name="chirho_function_index3", path="/home/jupyter/chromadb_functions_chirho", n_results=5
+    query, collection_name="chirho_function_index3", path=CHROMADB_PATH, n_results=5
 ):
-    collection = start_chromadb(collection_name=collection_name, path=path)
-    result = collection.query(query_texts=[query], n_results=n_results)
+    result = get_chroma().query(collection_name, path, query, n_results=n_results)
     text = ""
     for i in range(len(result["ids"][0])):
         text += f"Information related to for function or class: {result['ids'][0][i]} :\n{result['documents'][0][i]}\n"
@@ -31,6 +31,7 @@ class ClimateDataUtilityContext(BaseContext):
         self.climate_data_utility__functions = {}
         self.config = config
         self.dataset_map = {}
+        self.cache_stats = {}
         super().__init__(beaker_kernel, self.agent_cls, config)
         if not isinstance(self.subkernel, PythonSubkernel):
             raise ValueError("This context is only valid for Python.")
@@ -91,6 +92,12 @@ class ClimateDataUtilityContext(BaseContext):
             code,
             parent_header={},
         )
+        await self.update_cache_stats()
+
+    async def update_cache_stats(self):
+        response = await self.evaluate(self.get_code("dataset_cache_stats"))
+        self.cache_stats = response.get("return") or {}
+        self.beaker_kernel.debug("dataset_cache_stats", self.cache_stats)
 
     @intercept()
     async def save_dataset_request(self, message):
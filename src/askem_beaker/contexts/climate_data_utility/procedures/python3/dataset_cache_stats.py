@@ -0,0 +1,3 @@
+from askem_beaker.lib.dataset_cache import get_dataset_cache
+
+get_dataset_cache().stats()
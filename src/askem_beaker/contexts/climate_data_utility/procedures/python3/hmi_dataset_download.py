@@ -1,11 +1,11 @@
 import logging
 import os
-from io import BytesIO
-from json import JSONDecodeError
 
 import requests
 import xarray
 
+from askem_beaker.lib.dataset_cache import get_dataset_cache
+
 logger = logging.getLogger(__name__)
 
 # Get the HMI_SERVER endpoint from the environment variable
@@ -17,18 +17,16 @@ id = "{{id}}"
 # Prepare the request URL
 url = f"{hmi_server}/datasets/{id}/download-file?filename={{filename}}"
 
-# Make the HTTP GET request to retrieve the dataset
-response = requests.get(url, auth={{auth}}, stream=True)
-
-# Check the response status code
-if response.status_code <= 300:
-    message = f"Dataset retrieved successfully with status code {response.status_code}."
-    logger.info(response.content)
-else:
-    message = f"Dataset retrieval failed with status code {response.status_code}."
-    if response.text:
-        message += f" Response message: {response.text}"
+# Fetch the dataset through the local cache, which only downloads it again if it changed on the server
+try:
+    dataset_path = get_dataset_cache().fetch(url, f"datasets/{id}", "{{filename}}", auth={{auth}})
+    logger.info(f"Dataset retrieved successfully to {dataset_path}.")
+except requests.HTTPError as e:
+    message = f"Dataset retrieval failed with status code {e.response.status_code}."
+    if e.response.text:
+        message += f" Response message: {e.response.text}"
     logger.error(message)
+    raise
 
 
-{{variable_name}} = xarray.open_dataset(BytesIO(response.content))
+{{variable_name}} = xarray.open_dataset(dataset_path)
@@ -1,15 +1,19 @@
-import codecs
+import asyncio
 import copy
 import datetime
+import hashlib
 import os
-import requests
+import time
 from base64 import b64encode
+from uuid import uuid4
 from typing import TYPE_CHECKING, Any, Dict
 
 from beaker_kernel.lib.context import BaseContext
+from beaker_kernel.lib.subkernels.python import PythonSubkernel
 from beaker_kernel.lib.utils import intercept
 
 from .agent import DatasetAgent
+from askem_beaker.hmi import get_hmi_client
 from askem_beaker.utils import get_auth
 
 if TYPE_CHECKING:
@@ -20,6 +24,16 @@ if TYPE_CHECKING:
 import logging
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get("DATASET_DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+DOWNLOAD_FORMATS = ("csv", "parquet", "arrow")
+COLUMNAR_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
 
 class DatasetContext(BaseContext):
 
@@ -27,7 +41,10 @@ class DatasetContext(BaseContext):
 
     def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
         self.auth = get_auth()
+        self.hmi = get_hmi_client()
         self.asset_map = {}
+        self.asset_timings = {}
+        self.cache_stats = {}
         super().__init__(beaker_kernel, self.agent_cls, config)
 
     async def setup(self, context_info: dict, parent_header):
@@ -54,36 +71,66 @@ class DatasetContext(BaseContext):
             else:
                 raise ValueError("Unable to parse dataset mapping")
 
-            meta_url = f"{os.environ['HMI_SERVER_URL']}/{asset_type}s/{asset_id}"
-            asset_info_req = requests.get(meta_url, auth=self.auth.requests_auth())
-            if asset_info_req.status_code == 404:
-                raise Exception(f"Dataset '{asset_id}' not found.")
-            asset_info = asset_info_req.json()
-            if asset_info:
-                self.asset_map[var_name]["info"] = asset_info
-            else:
-                raise Exception(f"{asset_type.capitalize()} '{asset_id}' not able to be loaded.")
-        await self.load_dataframes()
+        # Resolve the metadata and download url for every asset at once rather than one round trip at a time.
+        self.asset_timings = {}
+        load_specs = await asyncio.gather(*(self.resolve_asset(var_name) for var_name in self.asset_map))
+        self.beaker_kernel.debug("dataset_asset_timings", self.asset_timings)
+        await self.load_dataframes(var_map=dict(zip(self.asset_map, load_specs)))
         await self.send_df_preview_message(parent_header=parent_header)
 
-    async def load_dataframes(self):
-        var_map = {}
-        for var_name, df_obj in self.asset_map.items():
-            asset_type = df_obj.get("asset_type", "dataset")
+    async def resolve_asset(self, var_name):
+        asset = self.asset_map[var_name]
+        asset_id = asset["id"]
+        asset_type = asset.get("asset_type", "dataset")
+
+        start = time.perf_counter()
+        asset_info_req = await self.hmi.aget(f"{asset_type}s/{asset_id}")
+        if asset_info_req.status_code == 404:
+            raise Exception(f"Dataset '{asset_id}' not found.")
+        asset_info = asset_info_req.json()
+        if asset_info:
+            asset["info"] = asset_info
+        else:
+            raise Exception(f"{asset_type.capitalize()} '{asset_id}' not able to be loaded.")
+        metadata_time = time.perf_counter() - start
+
+        load_spec = await self.fetch_load_spec(var_name)
+        total_time = time.perf_counter() - start
+        self.asset_timings[var_name] = {
+            "metadata": metadata_time,
+            "download_url": total_time - metadata_time,
+            "total": total_time,
+        }
+        logger.info(f"Resolved {asset_type} '{asset_id}' as '{var_name}' in {total_time:.3f}s")
+        return load_spec
 
-            if asset_type != "dataset":
-                filename = df_obj["info"].get("resultFiles", [])[0]
-            else:
-                filename = df_obj["info"].get("fileNames", [])[0]
+    async def fetch_load_spec(self, var_name):
+        """
+        Returns how the subkernel should load an asset: its download url, file format, and optionally the subset of
+        columns (`load_columns`) to load and whether columnar files should be memory-mapped (`memory_map`).
+        """
+        df_obj = self.asset_map[var_name]
+        asset_type = df_obj.get("asset_type", "dataset")
+
+        if asset_type != "dataset":
+            filename = df_obj["info"].get("resultFiles", [])[0]
+        else:
+            filename = df_obj["info"].get("fileNames", [])[0]
+
+        data_url_req = await self.hmi.aget(f"{asset_type}s/{df_obj['id']}/download-url", params={"filename": filename})
+        return {
+            "url": data_url_req.json().get("url", None),
+            "asset_id": f"{asset_type}s/{df_obj['id']}",
+            "filename": filename,
+            "format": COLUMNAR_FORMATS.get(os.path.splitext(filename)[1].lower(), "csv"),
+            "columns": df_obj.get("load_columns", None),
+            "memory_map": bool(df_obj.get("memory_map", False)),
+        }
 
-            meta_url = f"{os.environ['HMI_SERVER_URL']}/{asset_type}s/{df_obj['id']}"
-            url = f"{meta_url}/download-url?filename={filename}"
-            data_url_req = requests.get(
-                url=url,
-                auth=self.auth.requests_auth(),
-            )
-            data_url = data_url_req.json().get("url", None)
-            var_map[var_name] = data_url
+    async def load_dataframes(self, var_map=None):
+        if var_map is None:
+            load_specs = await asyncio.gather(*(self.fetch_load_spec(var_name) for var_name in self.asset_map))
+            var_map = dict(zip(self.asset_map, load_specs))
         command = "\n".join(
             [
                 self.get_code("setup"),
@@ -91,7 +138,16 @@ class DatasetContext(BaseContext):
             ]
         )
         await self.execute(command)
-        await self.update_asset_map()
+        await self.update_asset_map(full=True)
+        await self.update_cache_stats()
+
+    async def update_cache_stats(self):
+        # Only the Python procedures download through the shared dataset cache.
+        if not isinstance(self.subkernel, PythonSubkernel):
+            return
+        response = await self.evaluate("_dataset_cache_stats()")
+        self.cache_stats = response.get("return") or {}
+        self.beaker_kernel.debug("dataset_cache_stats", self.cache_stats)
 
     def reset(self):
         self.asset_map = {}
@@ -112,14 +168,19 @@ class DatasetContext(BaseContext):
         )
         return data
 
-    async def update_asset_map(self, parent_header={}):
-        code = self.get_code("df_info")
+    async def update_asset_map(self, parent_header={}, full=False):
+        """
+        Merges the dataframe changes reported by the subkernel into the asset map.
+
+        The df_info procedure only describes dataframes that changed since its previous run, unless `full` is set.
+        """
+        code = self.get_code("df_info", {"full": full})
         df_info_response = await self.evaluate(
             code,
             parent_header=parent_header,
         )
-        df_info = df_info_response.get('return')
-        for var_name, info in df_info.items():
+        df_info = df_info_response.get('return') or {}
+        for var_name, info in (df_info.get("changed") or {}).items():
             if var_name in self.asset_map:
                 self.asset_map[var_name].update(info)
             else:
@@ -128,6 +189,10 @@ class DatasetContext(BaseContext):
                     "description": "",
                     **info,
                 }
+        for var_name in df_info.get("removed") or []:
+            # Only forget dataframes created in the notebook; HMI assets keep their last known info.
+            if "id" not in self.asset_map.get(var_name, {"id": None}):
+                del self.asset_map[var_name]
 
     async def auto_context(self):
         intro = f"""
@@ -193,25 +258,73 @@ Statistics:
 
     @intercept()
     async def download_dataset_request(self, message):
+        """
+        Streams a dataframe to the client as numbered `download_chunk` messages of base64 encoded bytes.
+
+        A final `download_response` carries the number of chunks, total size and sha256 checksum so the client can
+        verify the reassembled file. `format` may be `csv` (default), `parquet` or `arrow` (Arrow IPC/Feather).
+        There is no flow control: the kernel yields to its event loop between chunks but doesn't wait for the client.
+        """
         content = message.content
         var_name = content.get("var_name", "df")
-        # TODO: Collect any options that might be needed, if they ever are
+        file_format = content.get("format", "csv")
+        chunk_size = int(content.get("chunk_size", DOWNLOAD_CHUNK_SIZE))
+        if file_format not in DOWNLOAD_FORMATS:
+            raise ValueError(f"Unsupported download format '{file_format}'. Expected one of {DOWNLOAD_FORMATS}.")
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be a positive number of bytes, got {chunk_size}.")
+
+        code = self.get_code("df_download", {"var_name": var_name, "format": file_format})
+        df_response = await self.evaluate(code, parent_header=message.header)
+        download = df_response.get("return")
+        if not download:
+            raise Exception(f"Unable to prepare '{var_name}' for download.")
+        # Subkernels that can only write csv report the format they actually used
+        file_format = download.get("format", file_format)
+
+        download_id = str(uuid4())
+        checksum = hashlib.sha256()
+        size = 0
+        chunk_count = 0
+        try:
+            with open(download["path"], "rb") as download_file:
+                while True:
+                    chunk = await asyncio.to_thread(download_file.read, chunk_size)
+                    if not chunk:
+                        break
+                    checksum.update(chunk)
+                    size += len(chunk)
+                    self.beaker_kernel.send_response(
+                        "iopub",
+                        "download_chunk",
+                        {
+                            "download_id": download_id,
+                            "index": chunk_count,
+                            "data": b64encode(chunk).decode(),
+                        },
+                        parent_header=message.header,
+                    )
+                    chunk_count += 1
+                    # Yield between chunks so a large download doesn't starve the kernel's other messages. This is
+                    # cooperative yielding only, not back-pressure: chunks are sent as fast as the file can be read.
+                    await asyncio.sleep(0)
+        finally:
+            os.remove(download["path"])
 
-        # TODO: This doesn't work very well. Is very slow to encode, and transfer all of the required messages multiple times proxies through the proxy kernel.
-        # We should find a better way to accomplish this if it's needed.
-        code = self.get_code("df_download", {"var_name": var_name})
-        df_response = await self.evaluate(code)
-        df_contents = df_response.get("stdout_list")
         self.beaker_kernel.send_response(
             "iopub",
             "download_response",
             {
-                "data": [
-                    codecs.encode(line.encode(), "base64").decode()
-                    for line in df_contents
-                ]
+                "download_id": download_id,
+                "var_name": var_name,
+                "filename": f"{var_name}.{file_format}",
+                "format": file_format,
+                "chunks": chunk_count,
+                "size": size,
+                "checksum": f"sha256:{checksum.hexdigest()}",
             },
-        )  # , parent_header=parent_header)
+            parent_header=message.header,
+        )
 
     @intercept()
     async def save_dataset_request(self, message):
@@ -221,13 +334,11 @@ Statistics:
         new_name = content.get("name")
         filename = content.get("filename", None)
         var_name = content.get("var_name", "df")
-        dataservice_url = os.environ["HMI_SERVER_URL"]
 
         if filename is None:
             filename = "dataset.csv"
 
-        parent_url = f"{dataservice_url}/datasets/{parent_dataset_id}"
-        parent_dataset = requests.get(parent_url, auth=self.auth.requests_auth()).json()
+        parent_dataset = (await self.hmi.aget(f"datasets/{parent_dataset_id}")).json()
         if not parent_dataset:
             raise Exception(f"Unable to locate parent dataset '{parent_dataset_id}'")
 
@@ -241,13 +352,12 @@ Statistics:
 
         import pprint
         logger.error(f"new dataset: {pprint.pformat(new_dataset)}")
-        create_req = requests.post(f"{dataservice_url}/datasets", auth=self.auth.requests_auth(), json=new_dataset)
+        create_req = await self.hmi.apost("datasets", json=new_dataset)
         new_dataset_id = create_req.json()["id"]
         logger.error(f"new dataset: {pprint.pformat(create_req.json())}")
 
         new_dataset["id"] = new_dataset_id
-        new_dataset_url = f"{dataservice_url}/datasets/{new_dataset_id}"
-        data_url_req = requests.get(f"{new_dataset_url}/upload-url?filename={filename}", auth=self.auth.requests_auth())
+        data_url_req = await self.hmi.aget(f"datasets/{new_dataset_id}/upload-url", params={"filename": filename})
         data_url = data_url_req.json().get('url', None)
 
         code = self.get_code(
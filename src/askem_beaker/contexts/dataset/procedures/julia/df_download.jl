@@ -1,8 +1,5 @@
-_output_buff = IOBuffer()
-CSV.write(_output_buff, {{ var_name|default("df") }}, writeheader=true)
+# Written to a private temp file so the context can stream it back in chunks without holding it in memory.
+_download_path = tempname() * ".csv"
+CSV.write(_download_path, {{ var_name|default("df") }}, writeheader=true)
 
-seekstart(_output_buff)
-
-for _line in readlines(_output_buff)
-    println(_line)
-end
+JSON3.write(Dict("path" => _download_path, "format" => "csv")) |> DisplayAs.unlimited
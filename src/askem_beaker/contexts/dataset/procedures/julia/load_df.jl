@@ -1,3 +1,3 @@
-{% for var_name, data_url in var_map.items() -%}
-{{ var_name|default("df") }} = DataFrame(CSV.File(IOBuffer(HTTP.get("{{ data_url }}").body)))
+{% for var_name, spec in var_map.items() -%}
+{{ var_name|default("df") }} = DataFrame(CSV.File(IOBuffer(HTTP.get("{{ spec.url }}").body)))
 {% endfor %}
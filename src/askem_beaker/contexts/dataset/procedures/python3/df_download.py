@@ -1,7 +1,17 @@
-import pandas as pd; import io
-output_buff = io.BytesIO()
-{{ var_name|default("df") }}.to_csv(output_buff, index=False, header=True)
-output_buff.seek(0)
+import os
+import tempfile
+import pandas as pd
 
-for line in output_buff.getvalue().splitlines():
-    print(line.decode())
+# Written to a private temp file so the context can stream it back in chunks without holding it in memory.
+_download_format = "{{ format|default("csv") }}"
+_download_fd, _download_path = tempfile.mkstemp(prefix="beaker_download_", suffix=f".{_download_format}")
+os.close(_download_fd)
+
+if _download_format == "parquet":
+    {{ var_name|default("df") }}.to_parquet(_download_path, index=False)
+elif _download_format == "arrow":
+    {{ var_name|default("df") }}.reset_index(drop=True).to_feather(_download_path)
+else:
+    {{ var_name|default("df") }}.to_csv(_download_path, index=False, header=True)
+
+{"path": _download_path, "format": _download_format}
@@ -2,16 +2,79 @@ import copy
 import json
 import pandas as pd
 
-_result = {}
+# Fingerprints of the dataframes described by the previous run, so unchanged dataframes can be skipped.
+try:
+    _df_info_cache
+except NameError:
+    _df_info_cache = {}
+if {{ full|default(False) }}:
+    _df_info_cache = {}
+
+_DF_INFO_FULL_HASH_ROWS = 100_000
+_DF_INFO_SAMPLE_ROWS = 10_000
+_DF_INFO_WHOLE_FRAME_COLUMNS = 8
+
+
+def _df_hash(df):
+    try:
+        return int(pd.util.hash_pandas_object(df, index=True).sum())
+    except TypeError:
+        # Columns holding unhashable values (lists, dicts, ...) fall back to hashing the text form
+        return hash(df.to_csv())
+
+
+def _df_sampled(df):
+    return len(df) > _DF_INFO_FULL_HASH_ROWS and len(df.columns) > _DF_INFO_WHOLE_FRAME_COLUMNS
+
+
+def _df_fingerprint(df):
+    """
+    Cheap fingerprint of a dataframe: identity, shape, columns, dtypes and a hash of its content.
+    Frames larger than _DF_INFO_FULL_HASH_ROWS hash evenly spaced sample rows plus the tail, and every row of up to
+    _DF_INFO_WHOLE_FRAME_COLUMNS evenly spaced columns along with the sums of the numeric columns, so most edits
+    outside the sample rows are still noticed. Only frames that are also wider than that are fingerprinted from a
+    sample of their values (see _df_sampled).
+    """
+    if len(df) <= _DF_INFO_FULL_HASH_ROWS:
+        content = _df_hash(df)
+    else:
+        step = len(df) // _DF_INFO_SAMPLE_ROWS
+        column_step = max(1, -(-len(df.columns) // _DF_INFO_WHOLE_FRAME_COLUMNS))
+        numeric = df.select_dtypes("number")
+        content = (
+            _df_hash(pd.concat([df.iloc[::step], df.tail(1)])),
+            _df_hash(df.iloc[:, ::column_step]),
+            tuple(numeric.sum().round(9).astype(str)) if len(numeric.columns) else (),
+        )
+    return (id(df), df.shape, tuple(map(str, df.columns)), tuple(map(str, df.dtypes)), content)
+
+
+_result = {"changed": {}, "removed": []}
+_seen = set()
 
 for _var_name, _df in ((k, v) for k, v in copy.copy(locals()).items() if isinstance(v, pd.DataFrame) and not k.startswith("_")):
+    _seen.add(_var_name)
+    _fingerprint = _df_fingerprint(_df)
+    if _df_info_cache.get(_var_name) == _fingerprint:
+        continue
+
     _split_df = json.loads(_df.head(30).to_json(orient="split"))
 
-    _result[_var_name] = {
+    _result["changed"][_var_name] = {
         "columns": _split_df["columns"],
         "datatypes": str(_df.dtypes),
         "head": [_split_df["columns"]] + _split_df["data"],
         "statistics": str(_df.describe()),
+        # Edits to values outside the fingerprinted sample of a large, wide frame may not be noticed, so the
+        # description can be stale until the frame is described in full again
+        "sampled": _df_sampled(_df),
     }
+    _df_info_cache[_var_name] = _fingerprint
+
+for _var_name in list(_df_info_cache):
+    if _var_name not in _seen:
+        del _df_info_cache[_var_name]
+        _result["removed"].append(_var_name)
 
-_result
\ No newline at end of file
+_df = None
+_result
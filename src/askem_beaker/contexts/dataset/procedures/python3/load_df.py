@@ -1,5 +1,3 @@
-import pandas as pd
-
-{% for var_name, data_url in var_map.items() -%}
-{{ var_name }} = pd.read_csv('{{ data_url }}',)
+{% for var_name, spec in var_map.items() -%}
+{{ var_name }} = _load_dataframe('{{ spec.url }}', '{{ spec.asset_id }}', '{{ spec.filename }}', file_format='{{ spec.format }}', columns={{ spec.columns }}, memory_map={{ spec.memory_map }})
 {% endfor %}
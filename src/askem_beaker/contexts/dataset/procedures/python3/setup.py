@@ -1 +1,58 @@
 import pandas as pd; import numpy as np; import scipy; import pickle
+import os as _os, tempfile as _tempfile
+
+from askem_beaker.lib.dataset_cache import get_dataset_cache as _get_dataset_cache
+
+try:
+    import pyarrow as _pa
+    import pyarrow.parquet as _pq
+except ImportError:
+    _pa = None
+    _pq = None
+
+
+def _read_columnar(path, file_format, columns=None, memory_map=False):
+    if _pa is None:
+        if file_format == "parquet":
+            return pd.read_parquet(path, columns=columns)
+        return pd.read_feather(path, columns=columns)
+    if file_format == "parquet":
+        table = _pq.read_table(path, columns=columns, memory_map=memory_map)
+    else:
+        source = _pa.memory_map(path, "r") if memory_map else _pa.OSFile(path, "rb")
+        table = _pa.ipc.open_file(source).read_all()
+        if columns:
+            table = table.select(columns)
+    return table.to_pandas()
+
+
+def _load_dataframe(url, asset_id, filename, file_format="csv", columns=None, memory_map=False):
+    cache = _get_dataset_cache()
+    path = cache.fetch(url, asset_id, filename)
+    if file_format != "csv":
+        return _read_columnar(path, file_format, columns=columns, memory_map=memory_map)
+
+    # CSVs are parsed by pandas once so dtypes match what `pd.read_csv` has always produced, then kept as parquet
+    # alongside the cached CSV so later loads of the same content skip parsing and can select columns.
+    cached_path = cache.derived_path(path, ".parquet")
+    if _pq is not None and _os.path.exists(cached_path):
+        return _read_columnar(cached_path, "parquet", columns=columns, memory_map=memory_map)
+    df = pd.read_csv(path)
+    if _pq is not None:
+        tmp_path = None
+        try:
+            fd, tmp_path = _tempfile.mkstemp(dir=_os.path.dirname(cached_path), suffix=".tmp")
+            _os.close(fd)
+            df.to_parquet(tmp_path)
+            _os.replace(tmp_path, cached_path)
+        except Exception:
+            # Mixed-type object columns can't always be written as parquet; just skip caching those.
+            if tmp_path and _os.path.exists(tmp_path):
+                _os.remove(tmp_path)
+    if columns:
+        df = df[columns]
+    return df
+
+
+def _dataset_cache_stats():
+    return _get_dataset_cache().stats()
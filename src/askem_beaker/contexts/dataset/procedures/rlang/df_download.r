@@ -1,8 +1,7 @@
-import pandas as pd; import io
-import time
-output_buff = io.BytesIO()
-{{ var_name|default("df") }}.to_csv(output_buff, index=False, header=True)
-output_buff.seek(0)
+library(jsonlite)
+# Written to a private temp file so the context can stream it back in chunks without holding it in memory.
+.download_path <- tempfile(pattern = "beaker_download_", fileext = ".csv")
+write.csv({{ var_name|default("df") }}, .download_path, row.names = FALSE)
 
-for line in output_buff.getvalue().splitlines():
-    print(line.decode())
+.p <- toJSON(list(path = .download_path, format = "csv"), auto_unbox = TRUE)
+print(toString(.p))
@@ -20,6 +20,6 @@ for (.var_name in ls()) {
     }
 }
 
-.p <- toJSON(.result, auto_unbox = TRUE)
+.p <- toJSON(list(changed = .result, removed = list()), auto_unbox = TRUE)
 .f <- toString(.p)
 print(.f)
\ No newline at end of file
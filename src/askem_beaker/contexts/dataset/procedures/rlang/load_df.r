@@ -1,3 +1,3 @@
-{% for var_name, data_url in var_map.items() -%}
-{{ var_name }} = read.csv("{{ data_url }}")
+{% for var_name, spec in var_map.items() -%}
+{{ var_name }} = read.csv("{{ spec.url }}")
 {% endfor %}
@@ -1,13 +1,10 @@
-import contextlib
-import importlib
-import inspect
-import io
 import json
 import logging
 import re
 
 from archytas.tool_utils import AgentRef, LoopControllerRef, tool, toolset
 from askem_beaker.contexts.mira.new_base_agent import NewBaseAgent
+from askem_beaker.lib.symbol_lookup import get_symbol_lookup
 
 from beaker_kernel.lib.agent import BaseAgent
 from beaker_kernel.lib.context import BaseContext
@@ -120,13 +117,7 @@ class Toolset:
             code,
             parent_header={},
         )
-        with open('/tmp/info.json', 'r') as f:
-            info = json.loads(f.read())
-        for var_name, info in info.items():
-            if var_name in functions:
-                functions[var_name] = info
-            else:
-                functions[var_name] = info
+        functions.update(info_response.get("return") or {})
 
         agent.context.functions.update(functions)
 
@@ -148,17 +139,15 @@ class Toolset:
         # TODO: figure out cause of this and remove ugly filter
         if type(list_of_function_or_class_names) == dict:
             list_of_function_or_class_names = list_of_function_or_class_names['list_of_function_or_class_names']
+        lookup = get_symbol_lookup()
         help_string = ''
-        for func_or_class_name in list_of_function_or_class_names:
-            module_name = func_or_class_name.rsplit('.', 1)[0]
-            importlib.import_module(module_name)
-
-            with io.StringIO() as buf, contextlib.redirect_stdout(buf):
-                help(func_or_class_name)
-                # Store the help text in the dictionary
-                help_text = buf.getvalue()
-            help_string += f'{func_or_class_name}: {help_text}'
-            agent.context.functions[func_or_class_name] = help_text
+        for func_or_class_name, result in lookup.help_texts(list_of_function_or_class_names).items():
+            if not result.found:
+                help_string += f'{func_or_class_name}: unable to find documentation ({result.error})\n'
+                continue
+            help_string += f'{func_or_class_name}: {result.text}'
+            agent.context.functions[func_or_class_name] = result.text
+        agent.debug(event_type="symbol_lookup_cache", content=lookup.stats())
         return help_string
 
     @tool(autosummarize=True)
@@ -177,18 +166,14 @@ class Toolset:
         # TODO: figure out cause of this and remove ugly filter
         if type(list_of_function_or_class_names) == dict:
             list_of_function_or_class_names = list_of_function_or_class_names['list_of_function_or_class_names']
+        lookup = get_symbol_lookup()
         help_string = ''
-        for func_or_class_name in list_of_function_or_class_names:
-            module_path, object_name = func_or_class_name.rsplit('.', 1)
-            module = importlib.import_module(module_path)
-            obj = getattr(module, object_name)
-            try:
-                source_code = inspect.getsource(obj)
-            except TypeError:
-                source_code = inspect.getsource(module)
-            # TODO: maybe use help on the object if it is an object and not a class?
-            help_string += f'{func_or_class_name} source code: \n{source_code}'
-            # agent.context.functions[func_or_class_name]=help_text
+        for func_or_class_name, result in lookup.source_code(list_of_function_or_class_names).items():
+            if not result.found:
+                help_string += f'{func_or_class_name}: unable to find source code ({result.error})\n'
+                continue
+            help_string += f'{func_or_class_name} source code: \n{result.text}'
+        agent.debug(event_type="symbol_lookup_cache", content=lookup.stats())
         return help_string
 
     @tool(autosummarize=True)
@@ -1,40 +1,30 @@
 import glob
 import json
 import logging
-import os
 
-import chromadb
-import openai
+from askem_beaker.lib.chroma import get_chroma
 
 logger = logging.getLogger(__name__)
 
+CHROMADB_PATH = "/home/jupyter/chromadb_functions_mira"
 
-def start_chromadb(collection_name="examples", path="/home/jupyter/chromadb_functions_mira"):
-    chroma_client = chromadb.PersistentClient(path=path)
-    print('collections are:')
-    print(chroma_client.list_collections())
 
-    collection = chroma_client.get_or_create_collection(name=collection_name)
-
-    openai.api_key = os.environ["OPENAI_API_KEY"]
-    return collection
+def start_chromadb(collection_name="examples", path=CHROMADB_PATH):
+    return get_chroma().collection(collection_name, path)
 
 
 def query_examples(query, n_results=5):
-    u_query_collection = start_chromadb(collection_name="user_queries")
-    examples_collection = start_chromadb(collection_name="examples")
-    results = u_query_collection.query(query_texts=[query], n_results=n_results)
+    chroma = get_chroma()
+    results = chroma.query("user_queries", CHROMADB_PATH, query, n_results=n_results)
     examples_ids = results["ids"][0]
-    examples = examples_collection.get(ids=examples_ids)["documents"]
-
-    print(examples)
+    examples = chroma.get("examples", CHROMADB_PATH, examples_ids)["documents"]
+    logger.debug(f"Found {len(examples)} examples for query")
 
     return examples
 
 
-def query_docs(query, collection_name="documentation_index", path="/home/jupyter/chromadb_functions_mira", n_results=5):
-    collection = start_chromadb(collection_name=collection_name, path=path)
-    result = collection.query(query_texts=[query], n_results=n_results)
+def query_docs(query, collection_name="documentation_index", path=CHROMADB_PATH, n_results=5):
+    result = get_chroma().query(collection_name, path, query, n_results=n_results)
     text = ""
     for i in range(len(result["ids"][0])):
         text += f"Documentation from {result['ids'][0][i]} :\n{result['documents'][0][i]}"
@@ -43,10 +33,9 @@ def query_docs(query, collection_name="documentation_index", path="/home/jupyter
 
 
 def query_functions_classes(
-    query, collection_name="function_index", path="/home/jupyter/chromadb_functions_mira", n_results=5
+    query, collection_name="function_index", path=CHROMADB_PATH, n_results=5
 ):
-    collection = start_chromadb(collection_name=collection_name, path=path)
-    result = collection.query(query_texts=[query], n_results=n_results)
+    result = get_chroma().query(collection_name, path, query, n_results=n_results)
     text = ""
     for i in range(len(result["ids"][0])):
         text += f"Information related to for function or class: {result['ids'][0][i]} :\n{result['documents'][0][i]}\n"
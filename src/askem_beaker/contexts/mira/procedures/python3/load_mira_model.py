@@ -1,5 +1,6 @@
 import copy
+from askem_beaker.utils import decode_payload
 from mira.sources.amr import model_from_json
-amr_json = {{amr_json}}
+amr_json = decode_payload("{{ amr_payload }}")
 {{ var_name|default("model") }} = model_from_json(amr_json)
 _{{ var_name|default("model") }}_orig = copy.deepcopy({{ var_name|default("model") }})
\ No newline at end of file
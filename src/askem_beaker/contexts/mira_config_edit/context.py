@@ -1,3 +1,4 @@
+import asyncio
 import copy
 import datetime
 import json
@@ -5,13 +6,13 @@ import logging
 import os
 from typing import TYPE_CHECKING, Any, Dict, Optional
 
-import requests
-from requests.auth import HTTPBasicAuth
-
 from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.utils import intercept
 
 from .agent import MiraConfigEditAgent
+from askem_beaker.hmi import get_hmi_client
+from askem_beaker.lib.mira_preview import PreviewDebouncer, send_preview_image
+from askem_beaker.utils import encode_payload
 
 if TYPE_CHECKING:
     from beaker_kernel.kernel import LLMKernel
@@ -32,6 +33,9 @@ class MiraConfigEditContext(BaseContext):
 
     def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
         self.reset()
+        self.hmi = get_hmi_client()
+        self.preview_debouncer = PreviewDebouncer(self.update_mira_preview)
+        self.preview_image_task = None
         logger.error("initializing...")
         super().__init__(beaker_kernel, self.agent_cls, config)
 
@@ -53,12 +57,9 @@ class MiraConfigEditContext(BaseContext):
 
     async def set_model_config(self, item_id, agent=None, parent_header={}):
         self.config_id = item_id
-        meta_url = f"{os.environ['HMI_SERVER_URL']}/model-configurations/as-configured-model/{self.config_id}"
-        logger.error(f"Meta url: {meta_url}")
-        self.amr = requests.get(meta_url,
-                                          auth=(os.environ['AUTH_USERNAME'],
-                                                os.environ['AUTH_PASSWORD'])
-                                                ).json()
+        meta_path = f"model-configurations/as-configured-model/{self.config_id}"
+        logger.error(f"Meta url: {self.hmi.url(meta_path)}")
+        self.amr = (await self.hmi.aget(meta_path)).json()
         logger.error(f"Succeeded in fetching configured model, proceeding.")
         self.schema_name = self.amr.get("header",{}).get("schema_name","petrinet")
         self.original_amr = copy.deepcopy(self.amr)
@@ -67,7 +68,7 @@ class MiraConfigEditContext(BaseContext):
             self.model_config = model_from_json(self.amr)            
         else:
             raise Exception(f"Model config '{item_id}' not found.")
-        await self.send_mira_preview_message(parent_header=parent_header)
+        await self.update_mira_preview(parent_header=parent_header, force=True)
 
     async def load_mira(self):
         command = "\n".join(
@@ -75,7 +76,7 @@ class MiraConfigEditContext(BaseContext):
                 self.get_code("setup"),
                 self.get_code("load_model", {
                     "var_name": self.var_name,
-                    "model": self.amr,
+                    "amr_payload": encode_payload(self.amr),
                 }),
             ]
         )
@@ -85,14 +86,40 @@ class MiraConfigEditContext(BaseContext):
     async def send_mira_preview_message(
         self, server=None, target_stream=None, data=None, parent_header={}
     ):
-        try:
-            preview = await self.evaluate(self.get_code("model_preview"), {"var_name": self.var_name, "schema_name": self.schema_name})
-            content = preview["return"]
+        # Cell executions and edit requests tend to come in bursts, so only the last request in a burst is previewed.
+        self.preview_debouncer.schedule(parent_header=parent_header)
+
+    async def update_mira_preview(self, parent_header={}, force=False):
+        """
+        Sends the model preview if the model changed since it was last sent: a full preview with the rendered graph if its
+        structure changed, otherwise a JSON patch of the AMR as a `model_preview_patch` message.
+        """
+        preview = await self.evaluate(self.get_code("model_preview", {"var_name": self.var_name, "schema_name": self.schema_name, "force": force}))
+        result = preview["return"]
+        if result["status"] == "full":
+            self.beaker_kernel.send_response(
+                "iopub", "model_preview", result["preview"], parent_header=parent_header
+            )
+            # The JSON goes out straight away; unless the graph was already rendered its image follows once it is ready.
+            if self.preview_image_task is not None:
+                self.preview_image_task.cancel()
+                self.preview_image_task = None
+            if result["image"]["status"] == "pending":
+                self.preview_image_task = asyncio.create_task(
+                    send_preview_image(self, result["image"]["key"], parent_header=parent_header)
+                )
+            elif result["image"]["status"] == "skipped":
+                logger.info(f"Skipped rendering model preview with {result['image']['nodes']} nodes")
+        elif result["status"] == "patch":
+            self.beaker_kernel.send_response(
+                "iopub", "model_preview_patch", {"patch": result["patch"]}, parent_header=parent_header
+            )
+        elif result["status"] == "suppressed":
             self.beaker_kernel.send_response(
-                "iopub", "model_preview", content, parent_header=parent_header
+                "iopub", "model_preview_suppressed",
+                {"templates": result["templates"], "max_templates": result["max_templates"]},
+                parent_header=parent_header,
             )
-        except Exception as e:
-            raise
 
     @intercept()
     async def save_model_config_request(self, message):
@@ -112,9 +139,8 @@ class MiraConfigEditContext(BaseContext):
             await self.evaluate(unloader)
         )["return"]
 
-        create_req = requests.put(
-            f"{os.environ['HMI_SERVER_URL']}/model-configurations/as-configured-model/{self.config_id}", json=new_model,
-                auth =(os.environ['AUTH_USERNAME'], os.environ['AUTH_PASSWORD'])
+        create_req = await self.hmi.aput(
+            f"model-configurations/as-configured-model/{self.config_id}", json=new_model
         )
 
         if create_req.status_code == 200:
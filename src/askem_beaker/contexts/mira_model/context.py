@@ -1,4 +1,5 @@
 
+import asyncio
 import copy
 import datetime
 import json
@@ -6,13 +7,14 @@ import logging
 import os
 from typing import TYPE_CHECKING, Any, Dict, Optional
 
-import requests
-
 from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.utils import intercept
 
 from .agent import MiraModelAgent
-from askem_beaker.utils import get_auth
+from askem_beaker.hmi import get_hmi_client
+from askem_beaker.lib.mira_preview import PreviewDebouncer, send_preview_image
+from askem_beaker.lib.mira_stratify import max_templates, stratify_limit_error, with_progress
+from askem_beaker.utils import encode_payload, get_auth
 
 if TYPE_CHECKING:
     from beaker_kernel.kernel import LLMKernel
@@ -34,6 +36,9 @@ class MiraModelContext(BaseContext):
     def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
         self.reset()
         self.auth = get_auth()
+        self.hmi = get_hmi_client()
+        self.preview_debouncer = PreviewDebouncer(self.update_mira_preview)
+        self.preview_image_task = None
         super().__init__(beaker_kernel, self.agent_cls, config)
 
     async def setup(self, context_info, parent_header):
@@ -46,19 +51,19 @@ class MiraModelContext(BaseContext):
         )
 
     async def post_execute(self, message):
+        # A cell can change the model without replacing it, so the template listings amr_to_templates keeps are dropped
+        await self.evaluate(self.get_code("invalidate_templates"))
         await self.send_mira_preview_message(parent_header=message.parent_header)
 
     async def set_model(self, item_id, item_type="model", agent=None, parent_header={}):
         if item_type == "model":
             self.model_id = item_id
             self.config_id = "default"
-            meta_url = f"{os.environ['HMI_SERVER_URL']}/models/{self.model_id}"
-            self.amr = requests.get(meta_url, auth=self.auth.requests_auth()).json()
+            self.amr = (await self.hmi.aget(f"models/{self.model_id}")).json()
             self.schema_name = self.amr.get("header",{}).get("schema_name","petrinet")
         elif item_type == "model_config":
             self.config_id = item_id
-            meta_url = f"{os.environ['HMI_SERVER_URL']}/model_configurations/{self.config_id}"
-            self.configuration = requests.get(meta_url, auth=self.auth.requests_auth()).json()
+            self.configuration = (await self.hmi.aget(f"model_configurations/{self.config_id}")).json()
             self.model_id = self.configuration.get("model_id")
             self.amr = self.configuration.get("configuration")
             self.schema_name = self.amr.get("header",{}).get("schema_name","petrinet")
@@ -67,17 +72,16 @@ class MiraModelContext(BaseContext):
             await self.load_mira()
         else:
             raise Exception(f"Model '{item_id}' not found.")
-        await self.send_mira_preview_message(parent_header=parent_header)
+        await self.update_mira_preview(parent_header=parent_header, force=True)
 
     async def load_mira(self):
-        model_url = f"{os.environ['HMI_SERVER_URL']}/models/{self.model_id}"
+        # The AMR was already fetched by set_model, so it is passed in rather than downloaded again by the subkernel
         command = "\n".join(
             [
                 self.get_code("setup"),
                 self.get_code("load_model", {
                     "var_name": self.var_name,
-                    "model_url": model_url,
-                    "auth_header": self.auth.auth_header(),
+                    "amr_payload": encode_payload(self.amr),
                 }),
             ]
         )
@@ -124,15 +128,40 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
     async def send_mira_preview_message(
         self, server=None, target_stream=None, data=None, parent_header={}
     ):
-        try:
+        # Cell executions and edit requests tend to come in bursts, so only the last request in a burst is previewed.
+        self.preview_debouncer.schedule(parent_header=parent_header)
 
-            preview = await self.evaluate(self.get_code("model_preview", {"var_name": self.var_name, "schema_name": self.schema_name}))
-            content = preview["return"]
+    async def update_mira_preview(self, parent_header={}, force=False):
+        """
+        Sends the model preview if the model changed since it was last sent: a full preview with the rendered graph if its
+        structure changed, otherwise a JSON patch of the AMR as a `model_preview_patch` message.
+        """
+        preview = await self.evaluate(self.get_code("model_preview", {"var_name": self.var_name, "schema_name": self.schema_name, "force": force}))
+        result = preview["return"]
+        if result["status"] == "full":
             self.beaker_kernel.send_response(
-                "iopub", "model_preview", content, parent_header=parent_header
+                "iopub", "model_preview", result["preview"], parent_header=parent_header
+            )
+            # The JSON goes out straight away; unless the graph was already rendered its image follows once it is ready.
+            if self.preview_image_task is not None:
+                self.preview_image_task.cancel()
+                self.preview_image_task = None
+            if result["image"]["status"] == "pending":
+                self.preview_image_task = asyncio.create_task(
+                    send_preview_image(self, result["image"]["key"], parent_header=parent_header)
+                )
+            elif result["image"]["status"] == "skipped":
+                logger.info(f"Skipped rendering model preview with {result['image']['nodes']} nodes")
+        elif result["status"] == "patch":
+            self.beaker_kernel.send_response(
+                "iopub", "model_preview_patch", {"patch": result["patch"]}, parent_header=parent_header
+            )
+        elif result["status"] == "suppressed":
+            self.beaker_kernel.send_response(
+                "iopub", "model_preview_suppressed",
+                {"templates": result["templates"], "max_templates": result["max_templates"]},
+                parent_header=parent_header,
             )
-        except Exception as e:
-            raise
 
     @intercept()
     async def save_amr_request(self, message):
@@ -175,17 +204,11 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
                     "description"
                 ] += f"\nfrom base configuration '{self.configuration.get('name')}' ({self.configuration.get('id')})"
 
-        create_req = requests.post(
-            f"{os.environ['HMI_SERVER_URL']}/models", json=new_model,
-            auth=self.auth.requests_auth(),
-        )
+        create_req = await self.hmi.apost("models", json=new_model)
         new_model_id = create_req.json()["id"]
 
         if project_id is not None:
-            update_req = requests.post(
-                f"{os.environ['HMI_SERVER_URL']}/projects/{project_id}/assets/model/{new_model_id}",
-                auth=self.auth.requests_auth(),
-            )
+            update_req = await self.hmi.apost(f"projects/{project_id}/assets/model/{new_model_id}")
 
         content = {"model_id": new_model_id}
         self.beaker_kernel.send_response(
@@ -193,25 +216,86 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
         )
 
 
+    @staticmethod
+    def amr_to_templates_args(content):
+        """
+        Validates the pagination arguments of an `amr_to_templates` message, returning them ready to render.
+        """
+        offset = int(content.get("offset", 0))
+        limit = content.get("limit", None)
+        limit = None if limit is None else int(limit)
+        indices = content.get("indices", None)
+        indices = None if indices is None else [int(index) for index in indices]
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError(f"offset and limit must not be negative (got offset={offset}, limit={limit})")
+        return {
+            "offset": offset,
+            "limit": repr(limit),
+            "indices": repr(indices),
+            "include_amr": bool(content.get("include_amr", True)),
+        }
+
     @intercept()
     async def amr_to_templates(self, message):
         content = message.content
         model_name = content.get("model_name", "model")
 
-        code = self.get_code("amr_to_templates", {
-            "var_name": model_name
-        })
-        result = (await self.evaluate(code))["return"]
+        try:
+            render_dict = self.amr_to_templates_args(content)
+        except (TypeError, ValueError) as e:
+            render_dict = None
+            error = str(e)
+        result = None
+        if render_dict is not None:
+            code = self.get_code("amr_to_templates", {"var_name": model_name, **render_dict})
+            result = (await self.evaluate(code) or {}).get("return")
+            if not isinstance(result, dict):
+                error = f"Unable to break down '{model_name}' into templates"
+            elif "error" in result:
+                error = result["error"]
+        if not isinstance(result, dict) or "error" in result:
+            logger.error(error)
+            self.beaker_kernel.send_response(
+                "iopub", "error", {
+                    "ename": "ValueError",
+                    "evalue": error,
+                    "traceback": [""]
+                }, parent_header=message.header
+            )
+            return
+        self.beaker_kernel.debug(event_type="amr_to_templates_cache", content=result.pop("cache"))
 
         content = {
             "success": True,
-            "templates": result["templates"]
+            **result,
         }
         self.beaker_kernel.send_response(
             "iopub", "amr_to_templates_response", content, parent_header=message.header
         )
 
 
+    async def estimate_stratify(self, model_name, stratify_args, message):
+        """
+        Estimates the size of the stratified model, returning None after sending an error if it would be too large.
+        """
+        estimate = (await self.evaluate(self.get_code("stratify_estimate", {
+            "var_name": model_name,
+            "stratify_kwargs": repr(stratify_args),
+        })))["return"]
+        estimate["max_templates"] = max_templates()
+        msg = stratify_limit_error(estimate, estimate["max_templates"])
+        if msg is not None:
+            logger.error(msg)
+            self.beaker_kernel.send_response(
+                "iopub", "error", {
+                    "ename": "ValueError",
+                    "evalue": msg,
+                    "traceback": [""]
+                }, parent_header=message.header
+            )
+            return None
+        return estimate
+
     @intercept()
     async def stratify_request(self, message):
         content = message.content
@@ -229,16 +313,23 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
                 }, parent_header=message.header
             )
             return
+        estimate = await self.estimate_stratify(model_name, stratify_args, message)
+        if estimate is None:
+            return
         stratify_code = self.get_code("stratify", {
             "var_name": model_name,
             "stratify_kwargs": repr(stratify_args),
             "schema_name": self.schema_name
         })
-        stratify_result = await self.execute(stratify_code)
+        stratify_code = "\n".join([stratify_code, self.get_code("invalidate_templates")])
+        stratify_result = await with_progress(
+            self, self.execute(stratify_code), {"estimate": estimate}, parent_header=message.header
+        )
 
         content = {
             "success": True,
             "executed_code": stratify_result["parent"].content["code"],
+            "estimate": estimate,
         }
 
         self.beaker_kernel.send_response(
@@ -255,7 +346,7 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
         reset_code = self.get_code("reset", {
             "var_name": model_name,
         })
-        reset_result = await self.execute(reset_code)
+        reset_result = await self.execute("\n".join([reset_code, self.get_code("invalidate_templates")]))
 
         content = {
             "success": True,
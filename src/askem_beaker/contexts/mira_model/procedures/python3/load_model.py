@@ -1,4 +1,5 @@
-import copy, requests
-amr_json = requests.get("{{ model_url }}", headers={{auth_header}}).json()
+import copy
+from askem_beaker.utils import decode_payload
+amr_json = decode_payload("{{ amr_payload }}")
 {{ var_name|default("model") }} = model_from_json(amr_json)
-_model_orig = copy.deepcopy({{ var_name|default("model") }})
\ No newline at end of file
+_model_orig = copy.deepcopy({{ var_name|default("model") }})
@@ -0,0 +1,3 @@
+from askem_beaker.lib.mira_render import get_preview_renderer as _get_preview_renderer
+
+_get_preview_renderer().result("{{ key }}")
@@ -1,3 +1,4 @@
+import asyncio
 import copy
 import datetime
 import json
@@ -5,14 +6,14 @@ import logging
 import os
 from typing import TYPE_CHECKING, Any, Dict, Optional
 
-import requests
-from requests.auth import HTTPBasicAuth
-
 from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.utils import intercept
 
 from .agent import MiraModelEditAgent
-from askem_beaker.utils import get_auth
+from askem_beaker.hmi import get_hmi_client
+from askem_beaker.lib.mira_preview import PreviewDebouncer, send_preview_image
+from askem_beaker.lib.mira_stratify import max_templates, stratify_limit_error, with_progress
+from askem_beaker.utils import encode_payload, get_auth
 
 if TYPE_CHECKING:
     from beaker_kernel.kernel import LLMKernel
@@ -25,6 +26,36 @@ class MiraModelEditContext(BaseContext):
 
 	agent_cls = MiraModelEditAgent
 
+	# Edit procedures that can be sent as operations of a batch_edit_request. Each operation's `args` are passed to its
+	# procedure as is, the same as the arguments of the matching request.
+	BATCH_EDIT_OPERATIONS = (
+		"replace_template_name",
+		"replace_state_name",
+		"add_natural_conversion_template",
+		"add_natural_production_template",
+		"add_natural_degradation_template",
+		"add_controlled_conversion_template",
+		"add_controlled_production_template",
+		"add_controlled_degradation_template",
+		"remove_template",
+		"add_parameter",
+		"update_parameter",
+		"add_observable",
+		"remove_observable",
+		"replace_ratelaw",
+		"stratify",
+	)
+	# Arguments of the stratify procedure that change the size of the stratified model
+	STRATIFY_ESTIMATE_ARGS = (
+		"key",
+		"strata",
+		"structure",
+		"directed",
+		"cartesian_control",
+		"concepts_to_stratify",
+		"params_to_stratify",
+	)
+
 	model_id: Optional[str]
 	model_json: Optional[str]
 	model_dict: Optional[dict[str, Any]]
@@ -34,6 +65,9 @@ class MiraModelEditContext(BaseContext):
 	def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
 		self.reset()
 		self.auth = get_auth()
+		self.hmi = get_hmi_client()
+		self.preview_debouncer = PreviewDebouncer(self.update_mira_preview)
+		self.preview_image_task = None
 		super().__init__(beaker_kernel, self.agent_cls, config)
     
 	async def setup(self, context_info, parent_header):
@@ -47,31 +81,32 @@ class MiraModelEditContext(BaseContext):
 		)
 
 	async def post_execute(self, message):
+		# A cell can change the model in ways the edit procedures' template index and amr_to_templates' listings can't
+		# follow, and change objects the undo history shares with the model, so all of them are reset
+		await self.evaluate(self.get_code("invalidate_edit_state", {"var_name": self.var_name}))
 		await self.send_mira_preview_message(parent_header=message.parent_header)
 
 	async def set_model(self, item_id, item_type="model", agent=None, parent_header={}):
 		if item_type == "model":
 			self.model_id = item_id
 			self.config_id = "default"
-			meta_url = f"{os.environ['HMI_SERVER_URL']}/models/{self.model_id}"
-			self.amr = requests.get(meta_url, auth=self.auth.requests_auth()).json()
+			self.amr = (await self.hmi.aget(f"models/{self.model_id}")).json()
 			self.schema_name = self.amr.get("header",{}).get("schema_name","petrinet")
 		self.original_amr = copy.deepcopy(self.amr)
 		if self.amr:
 			await self.load_mira()
 		else:
 			raise Exception(f"Model '{item_id}' not found.")
-		await self.send_mira_preview_message(parent_header=parent_header)
+		await self.update_mira_preview(parent_header=parent_header, force=True)
 
 	async def load_mira(self):
-		model_url = f"{os.environ['HMI_SERVER_URL']}/models/{self.model_id}"
+		# The AMR was already fetched by set_model, so it is passed in rather than downloaded again by the subkernel
 		command = "\n".join(
 				[
 						self.get_code("setup"),
 						self.get_code("load_model", {
 								"var_name": self.var_name,
-								"model_url": model_url,
-								"auth_header": self.auth.auth_header(),
+								"amr_payload": encode_payload(self.amr),
 						}),
 				]
 		)
@@ -84,21 +119,96 @@ class MiraModelEditContext(BaseContext):
 	async def send_mira_preview_message(
 		self, server=None, target_stream=None, data=None, parent_header={}
 	):
-		try:
-			preview = await self.evaluate(self.get_code("model_preview", {"var_name": self.var_name, "schema_name": self.schema_name}))
-			content = preview["return"]
+		# Cell executions and edit requests tend to come in bursts, so only the last request in a burst is previewed.
+		self.preview_debouncer.schedule(parent_header=parent_header)
+
+	async def update_mira_preview(self, parent_header={}, force=False):
+		"""
+		Sends the model preview if the model changed since it was last sent: a full preview with the rendered graph if its
+		structure changed, otherwise a JSON patch of the AMR as a `model_preview_patch` message.
+		"""
+		preview = await self.evaluate(self.get_code("model_preview", {"var_name": self.var_name, "schema_name": self.schema_name, "force": force}))
+		result = preview["return"]
+		if result["status"] == "full":
+			self.beaker_kernel.send_response(
+				"iopub", "model_preview", result["preview"], parent_header=parent_header
+			)
+			# The JSON goes out straight away; unless the graph was already rendered its image follows once it is ready.
+			if self.preview_image_task is not None:
+				self.preview_image_task.cancel()
+				self.preview_image_task = None
+			if result["image"]["status"] == "pending":
+				self.preview_image_task = asyncio.create_task(
+					send_preview_image(self, result["image"]["key"], parent_header=parent_header)
+				)
+			elif result["image"]["status"] == "skipped":
+				logger.info(f"Skipped rendering model preview with {result['image']['nodes']} nodes")
+		elif result["status"] == "patch":
+			self.beaker_kernel.send_response(
+				"iopub", "model_preview_patch", {"patch": result["patch"]}, parent_header=parent_header
+			)
+		elif result["status"] == "suppressed":
 			self.beaker_kernel.send_response(
-					"iopub", "model_preview", content, parent_header=parent_header
+				"iopub", "model_preview_suppressed",
+				{"templates": result["templates"], "max_templates": result["max_templates"]},
+				parent_header=parent_header,
 			)
-		except Exception as e:
-			raise
+
+	def get_edit_code(self, name, render_dict):
+		"""
+		Renders an edit procedure preceded by a checkpoint of the model, so the edit can be undone, and followed by
+		invalidating amr_to_templates' listings, which can't tell an edit made in place.
+		"""
+		return "\n".join([
+			self.get_code("checkpoint", {"var_name": render_dict.get("var_name", "model")}),
+			self.get_code(name, render_dict),
+			self.get_code("invalidate_templates"),
+		])
+
+	async def send_history_response(self, message, response_type, result, model_name="model"):
+		history = await self.evaluate(self.get_code("edit_history", {"var_name": model_name}))
+		content = {
+				"success": result["error"] is None,
+				"executed_code": result["parent"].content["code"],
+				"history": history["return"],
+		}
+		if result["error"] is not None:
+			# e.g. there was nothing to undo, in which case the model is unchanged
+			content["error"] = {"ename": result["error"]["ename"], "evalue": result["error"]["evalue"]}
+		self.beaker_kernel.send_response(
+				"iopub", response_type, content, parent_header=message.header
+		)
+		if result["error"] is None:
+			await self.send_mira_preview_message(parent_header=message.header)
+
+	@intercept()
+	async def undo_request(self, message):
+		content = message.content
+
+		model_name = content.get("model_name", "model")
+		undo_result = await self.execute("\n".join([
+				self.get_code("undo", {"var_name": model_name}),
+				self.get_code("invalidate_templates"),
+		]))
+		await self.send_history_response(message, "undo_response", undo_result, model_name)
+
+	@intercept()
+	async def redo_request(self, message):
+		content = message.content
+
+		model_name = content.get("model_name", "model")
+		redo_result = await self.execute("\n".join([
+				self.get_code("redo", {"var_name": model_name}),
+				self.get_code("invalidate_templates"),
+		]))
+		await self.send_history_response(message, "redo_response", redo_result, model_name)
 
 	@intercept()
 	async def reset_request(self, message):
 		content = message.content
 
 		model_name = content.get("model_name", "model")
-		reset_code = self.get_code("reset", {
+		reset_code = self.get_edit_code("reset", {
 				"var_name": model_name,
 		})
 		reset_result = await self.execute(reset_code)
@@ -120,7 +230,7 @@ class MiraModelEditContext(BaseContext):
 		old_name  = content.get("old_name")
 		new_name = content.get("new_name")
 
-		code = self.get_code("replace_template_name", {
+		code = self.get_edit_code("replace_template_name", {
 			"old_name": old_name,
 			"new_name": new_name
 		})
@@ -143,7 +253,7 @@ class MiraModelEditContext(BaseContext):
 		old_name  = content.get("old_name")
 		new_name = content.get("new_name")
 
-		code = self.get_code("replace_state_name", {
+		code = self.get_edit_code("replace_state_name", {
 			"template_name": template_name,
 			"old_name": old_name,
 			"new_name": new_name
@@ -174,7 +284,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_natural_conversion_template", {
+		code = self.get_edit_code("add_natural_conversion_template", {
 			"subject_name": subject_name,
 			"subject_initial_value": subject_initial_value,
 			"outcome_name": outcome_name,
@@ -210,7 +320,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_natural_production_template", {
+		code = self.get_edit_code("add_natural_production_template", {
 			"outcome_name": outcome_name,
 			"outcome_initial_value": outcome_initial_value,
 			"parameter_name": parameter_name,
@@ -244,7 +354,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_natural_degradation_template", {
+		code = self.get_edit_code("add_natural_degradation_template", {
 			"subject_name": subject_name,
 			"subject_initial_value": subject_initial_value,
 			"parameter_name": parameter_name,
@@ -282,7 +392,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_controlled_conversion_template", {
+		code = self.get_edit_code("add_controlled_conversion_template", {
 			"subject_name": subject_name,
 			"subject_initial_value": subject_initial_value,
 			"outcome_name": outcome_name,
@@ -322,7 +432,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_controlled_production_template", {
+		code = self.get_edit_code("add_controlled_production_template", {
 			"outcome_name": outcome_name,
 			"outcome_initial_value": outcome_initial_value,
 			"controller_name": controller_name,
@@ -360,7 +470,7 @@ class MiraModelEditContext(BaseContext):
 		template_expression = content.get("template_expression")
 		template_name = content.get("template_name")
 
-		code = self.get_code("add_controlled_degradation_template", {
+		code = self.get_edit_code("add_controlled_degradation_template", {
 			"subject_name": subject_name,
 			"subject_initial_value": subject_initial_value,
 			"controller_name": controller_name,
@@ -389,7 +499,7 @@ class MiraModelEditContext(BaseContext):
 
 		template_name = content.get("template_name")
 
-		code = self.get_code("remove_template", {
+		code = self.get_edit_code("remove_template", {
 			"template_name": template_name
 		})
 		result = await self.execute(code)
@@ -414,7 +524,7 @@ class MiraModelEditContext(BaseContext):
 		distribution = content.get("distribution")
 		units_mathml = content.get("units_mathml")
 
-		code = self.get_code("add_parameter", {
+		code = self.get_edit_code("add_parameter", {
 			"parameter_id": parameter_id,
 			"name": name,
 			"description": description,
@@ -440,7 +550,7 @@ class MiraModelEditContext(BaseContext):
 		updated_id  = content.get("updated_id")
 		replacement_value  = content.get("replacement_value")
 
-		code = self.get_code("update_parameter", {
+		code = self.get_edit_code("update_parameter", {
 			"updated_id": updated_id,
 			"replacement_value": replacement_value
 		})
@@ -463,7 +573,7 @@ class MiraModelEditContext(BaseContext):
 		new_name  = content.get("new_name")
 		new_expression  = content.get("new_expression")
 
-		code = self.get_code("add_observable", {
+		code = self.get_edit_code("add_observable", {
 			"new_id": new_id,
 			"new_name": new_name,
 			"new_expression": new_expression
@@ -485,7 +595,7 @@ class MiraModelEditContext(BaseContext):
 
 		remove_id  = content.get("remove_id")
 
-		code = self.get_code("remove_observable", {
+		code = self.get_edit_code("remove_observable", {
 			"remove_id": remove_id
 		})
 		result = await self.execute(code)
@@ -506,7 +616,7 @@ class MiraModelEditContext(BaseContext):
 		template_name  = content.get("template_name")
 		new_rate_law  = content.get("new_rate_law")
 		
-		code = self.get_code("replace_ratelaw", {
+		code = self.get_edit_code("replace_ratelaw", {
 			"template_name": template_name,
 			"new_rate_law": new_rate_law
 		})
@@ -522,24 +632,169 @@ class MiraModelEditContext(BaseContext):
 		)
 		await self.send_mira_preview_message(parent_header=message.header)
 
+	def get_batch_operation_code(self, model_name, name, args):
+		"""
+		Renders one step of a batch edit. Stratify steps first check the size of the stratified model, as the model
+		they stratify is only known once the steps before them have run.
+		"""
+		code = self.get_code(name, args)
+		if name != "stratify":
+			return code
+		stratify_args = {key: args[key] for key in self.STRATIFY_ESTIMATE_ARGS if args.get(key) is not None}
+		return "\n".join([
+			self.get_code("stratify_check", {"var_name": model_name, "stratify_kwargs": repr(stratify_args)}),
+			code,
+		])
+
+	@intercept()
+	async def batch_edit_request(self, message):
+		content = message.content
+
+		model_name = content.get("model_name", self.var_name)
+		operations = content.get("operations", [])
+		if model_name != self.var_name:
+			# The edit procedures only ever edit the context's model, so a batch on another variable couldn't be undone
+			logger.error(f"Batch edits can only be applied to '{self.var_name}', not '{model_name}'")
+			self.beaker_kernel.send_response(
+				"iopub", "error", {
+					"ename": "ValueError",
+					"evalue": f"Batch edits can only be applied to '{self.var_name}', not '{model_name}'",
+					"traceback": [""]
+				}, parent_header=message.header
+			)
+			return
+		unknown = [operation.get("operation") for operation in operations if operation.get("operation") not in self.BATCH_EDIT_OPERATIONS]
+		if unknown:
+			logger.error(f"Unknown batch edit operations: {unknown}")
+			self.beaker_kernel.send_response(
+				"iopub", "error", {
+					"ename": "ValueError",
+					"evalue": f"Unknown batch edit operations: {', '.join(map(str, unknown))}",
+					"traceback": [""]
+				}, parent_header=message.header
+			)
+			return
+
+		# The operations run as a single cell that restores the model if any of them fails, and the preview is sent once
+		# for the whole batch.
+		code = self.get_code("batch_edit", {
+			"var_name": model_name,
+			"operations": [
+				{
+					"name": operation["operation"],
+					"code": self.get_batch_operation_code(model_name, operation["operation"], operation.get("args", {})),
+				}
+				for operation in operations
+			],
+		})
+		stratify_steps = [
+			f"{index}: {operation['operation']}"
+			for index, operation in enumerate(operations, start=1)
+			if operation["operation"] == "stratify"
+		]
+		if stratify_steps:
+			result = await with_progress(
+				self, self.execute(code), {"estimate": None, "operations": stratify_steps}, parent_header=message.header
+			)
+		else:
+			result = await self.execute(code)
+		content = {
+			"success": result["error"] is None,
+			"executed_code": result["parent"].content["code"],
+		}
+		if result["error"] is not None:
+			# The batch was rolled back, so the model is as it was and there is no new preview to send
+			content["failed_operation"] = (await self.evaluate("_batch_edit_step"))["return"]
+			content["error"] = {"ename": result["error"]["ename"], "evalue": result["error"]["evalue"]}
+			self.beaker_kernel.send_response(
+				"iopub", "batch_edit_response", content, parent_header=message.header
+			)
+			return
+
+		self.beaker_kernel.send_response(
+			"iopub", "batch_edit_response", content, parent_header=message.header
+		)
+		await self.send_mira_preview_message(parent_header=message.header)
+
+	@staticmethod
+	def amr_to_templates_args(content):
+		"""
+		Validates the pagination arguments of an `amr_to_templates` message, returning them ready to render.
+		"""
+		offset = int(content.get("offset", 0))
+		limit = content.get("limit", None)
+		limit = None if limit is None else int(limit)
+		indices = content.get("indices", None)
+		indices = None if indices is None else [int(index) for index in indices]
+		if offset < 0 or (limit is not None and limit < 0):
+			raise ValueError(f"offset and limit must not be negative (got offset={offset}, limit={limit})")
+		return {
+			"offset": offset,
+			"limit": repr(limit),
+			"indices": repr(indices),
+			"include_amr": bool(content.get("include_amr", True)),
+		}
+
 	@intercept()
 	async def amr_to_templates(self, message):
 		content = message.content
 		model_name = content.get("model_name", "model")
 
-		code = self.get_code("amr_to_templates", {
-			"var_name": model_name
-		})
-		result = (await self.evaluate(code))["return"]
+		try:
+			render_dict = self.amr_to_templates_args(content)
+		except (TypeError, ValueError) as e:
+			render_dict = None
+			error = str(e)
+		result = None
+		if render_dict is not None:
+			code = self.get_code("amr_to_templates", {"var_name": model_name, **render_dict})
+			result = (await self.evaluate(code) or {}).get("return")
+			if not isinstance(result, dict):
+				error = f"Unable to break down '{model_name}' into templates"
+			elif "error" in result:
+				error = result["error"]
+		if not isinstance(result, dict) or "error" in result:
+			logger.error(error)
+			self.beaker_kernel.send_response(
+				"iopub", "error", {
+					"ename": "ValueError",
+					"evalue": error,
+					"traceback": [""]
+				}, parent_header=message.header
+			)
+			return
+		self.beaker_kernel.debug(event_type="amr_to_templates_cache", content=result.pop("cache"))
 
 		content = {
 			"success": True,
-			"templates": result["templates"]
+			**result,
 		}
 		self.beaker_kernel.send_response(
 			"iopub", "amr_to_templates_response", content, parent_header=message.header
 		)
 
+	async def estimate_stratify(self, stratify_args, message):
+		"""
+		Estimates the size of the stratified model, returning None after sending an error if it would be too large.
+		"""
+		estimate = (await self.evaluate(self.get_code("stratify_estimate", {
+			"var_name": self.var_name,
+			"stratify_kwargs": repr(stratify_args),
+		})))["return"]
+		estimate["max_templates"] = max_templates()
+		msg = stratify_limit_error(estimate, estimate["max_templates"])
+		if msg is not None:
+			logger.error(msg)
+			self.beaker_kernel.send_response(
+				"iopub", "error", {
+					"ename": "ValueError",
+					"evalue": msg,
+					"traceback": [""]
+				}, parent_header=message.header
+			)
+			return None
+		return estimate
+
 	@intercept()
 	async def stratify_request(self, message):
 		content = message.content
@@ -551,7 +806,7 @@ class MiraModelEditContext(BaseContext):
 		cartesian_control = content.get("cartesian_control")
 		structure = content.get("structure")
 
-		stratify_code = self.get_code("stratify", {
+		stratify_code = self.get_edit_code("stratify", {
 		    "key": key,
 		    "strata": strata,
 		    "concepts_to_stratify": concepts_to_stratify,
@@ -559,11 +814,24 @@ class MiraModelEditContext(BaseContext):
 		    "cartesian_control": cartesian_control,
 		    "structure": structure
 		})
-		stratify_result = await self.execute(stratify_code)
+		estimate = await self.estimate_stratify({
+		    "key": key,
+		    "strata": strata,
+		    "structure": structure,
+		    "cartesian_control": cartesian_control or False,
+		    "concepts_to_stratify": concepts_to_stratify,
+		    "params_to_stratify": params_to_stratify,
+		}, message)
+		if estimate is None:
+			return
+		stratify_result = await with_progress(
+			self, self.execute(stratify_code), {"estimate": estimate}, parent_header=message.header
+		)
 
 		content = {
 		    "success": True,
 		    "executed_code": stratify_result["parent"].content["code"],
+		    "estimate": estimate,
 		}
 
 		self.beaker_kernel.send_response(
@@ -1,4 +1,4 @@
-concepts_name_map = model.get_concepts_name_map()
+concepts_name_map = _get_template_index().of(model).concepts
 if "{{ subject_name }}" not in concepts_name_map:
     subject_concept = Concept(name = "{{ subject_name }}")
 else:
@@ -39,3 +39,4 @@ model = model.add_template(
     parameter_mapping = parameters,
     initial_mapping = initials
 )
+_get_template_index().appended(model)
@@ -0,0 +1,17 @@
+from askem_beaker.lib.mira_templates import invalidate_template_catalogs as _invalidate_template_catalogs
+_batch_edit_history = _get_history("{{ var_name|default("model") }}")
+_batch_edit_history.checkpoint({{ var_name|default("model") }})
+_batch_edit_step = None
+try:
+{%- for operation in operations %}
+    _batch_edit_step = "{{ loop.index }}: {{ operation.name }}"
+{{ operation.code|indent(4, true) }}
+{%- endfor %}
+    pass
+except Exception:
+    # Roll back to the checkpoint, so a batch is applied either in full or not at all
+    {{ var_name|default("model") }} = _batch_edit_history.rollback()
+    print(f"Batch edit failed on operation {_batch_edit_step}, no changes were applied.")
+    raise
+finally:
+    _invalidate_template_catalogs()
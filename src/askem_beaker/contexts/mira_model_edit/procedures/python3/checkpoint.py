@@ -0,0 +1 @@
+_get_history("{{ var_name|default("model") }}").checkpoint({{ var_name|default("model") }})
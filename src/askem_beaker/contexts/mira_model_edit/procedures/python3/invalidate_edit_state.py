@@ -0,0 +1,5 @@
+from askem_beaker.lib.mira_templates import invalidate_template_catalogs as _invalidate_template_catalogs
+_get_template_index("{{ var_name|default("model") }}").invalidate()
+_invalidate_template_catalogs()
+# Snapshots share templates with the model, and the cell may have changed them in place without copying them first
+_get_history("{{ var_name|default("model") }}").clear()
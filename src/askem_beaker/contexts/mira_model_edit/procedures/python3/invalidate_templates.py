@@ -0,0 +1,2 @@
+from askem_beaker.lib.mira_templates import invalidate_template_catalogs as _invalidate_template_catalogs
+_invalidate_template_catalogs()
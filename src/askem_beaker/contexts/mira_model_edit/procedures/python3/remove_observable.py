@@ -15,7 +15,7 @@ def remove_observable(model, removed_id: str):
     """
     assert isinstance(model, TemplateModel)
     tm = model
-    for obs, observable in copy.deepcopy(tm.observables).items():
+    for obs in list(tm.observables):
         if obs == removed_id:
             tm.observables.pop(obs)
     return tm
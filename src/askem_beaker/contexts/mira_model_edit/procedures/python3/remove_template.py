@@ -2,7 +2,8 @@ def remove_template(tm: TemplateModel, template_name) -> TemplateModel:
 
     # Create new template model,
     # skipping over templates with given names
-    tm_new = copy.deepcopy(tm)
+    # The templates that are kept are shared with the original model
+    tm_new = _shallow_copy(tm)
     tm_new.templates = []
     for t in tm.templates:
         if t.name in template_name:
@@ -18,9 +18,11 @@ def replace_rate_law_sympy(model, template_name, new_rate_law):
     """
     assert isinstance(model, TemplateModel)
     tm = model
-    for template in tm.templates:
-        if template.name == template_name:
-            template.set_rate_law(new_rate_law, local_dict=None)
+    template_index = _get_template_index().of(tm)
+    for position in template_index.templates_named(template_name):
+        template = _get_history().writable(tm.templates, position)
+        template.set_rate_law(new_rate_law, local_dict=None)
+        template_index.update(tm, position)
     return tm
 
 model = replace_rate_law_sympy(model, "{{ template_name }}", "{{ new_rate_law }}")
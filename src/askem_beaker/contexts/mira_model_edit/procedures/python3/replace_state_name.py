@@ -10,7 +10,8 @@ def replace_state_name(model , template_name: str, old_name: str, new_name: str)
     """
 
     # Check if concept with old name exists
-    concepts_name_map = model.get_concepts_name_map()
+    template_index = _get_template_index().of(model)
+    concepts_name_map = template_index.concepts
     if old_name not in concepts_name_map:
         raise ValueError(f"State with name {old_name} not found in model.")
     
@@ -26,27 +27,33 @@ def replace_state_name(model , template_name: str, old_name: str, new_name: str)
         raise ValueError(f"Name {old_name} already used by a model parameter.")
         
     # Rename name of concept
-    for template in model.templates:
-        if template.name == template_name:
-            if old_name in template.get_concept_names():
-                for concept in template.get_concepts():
-                    if concept.name == old_name: 
+    positions = template_index.templates_named(template_name)
+    for position in positions:
+        template = _get_history().writable(model.templates, position)
+        if old_name in template.get_concept_names():
+            for concept in template.get_concepts():
+                if concept.name == old_name: 
 
-                        if new_name not in concepts_name_map:
-                            concept.name = new_name
-                        else:
-                            for role in template.concept_keys:
-                                if getattr(template, role).name == old_name:
-                                    setattr(template, role, new_concept)
+                    if new_name not in concepts_name_map:
+                        concept.name = new_name
+                    else:
+                        for role in template.concept_keys:
+                            if getattr(template, role).name == old_name:
+                                setattr(template, role, new_concept)
+
+            template.rate_law = SympyExprStr(
+                template.rate_law.args[0].subs(
+                    sympy.Symbol(old_name), sympy.Symbol(new_name))
+                )
+
+    # Re-indexed once all the templates are renamed, as the loop relies on the concepts from before the edit
+    for position in positions:
+        template_index.update(model, position)
 
-                template.rate_law = SympyExprStr(
-                    template.rate_law.args[0].subs(
-                        sympy.Symbol(old_name), sympy.Symbol(new_name))
-                    )
-    
     # Update observable expressions with new state name
-    for observable in model.observables.values():
+    for key, observable in model.observables.items():
         if sympy.Symbol(old_name) in observable.expression.free_symbols:
+            observable = _get_history().writable(model.observables, key)
             observable.expression = SympyExprStr(
                 observable.expression.args[0].subs(
                     sympy.Symbol(old_name), sympy.Symbol(new_name))
@@ -55,11 +62,11 @@ def replace_state_name(model , template_name: str, old_name: str, new_name: str)
     # Ditto for initials
     if (old_name in model.initials) & (new_name not in model.initials):
         model.initials[new_name] = model.initials.pop(old_name)
-        model.initials[new_name].concept.name = new_name
+        _get_history().writable(model.initials, new_name).concept.name = new_name
     if (old_name in model.initials) & (new_name in model.initials):
         __ = model.initials.pop(old_name)
     if (new_name not in model.initials):
-        concept = model.get_concepts_name_map()[new_name]
+        concept = template_index.concepts[new_name]
         model.initials[new_name] = Initial(concept = concept, expression = sympy.Float(1))
 
     return model
@@ -1,11 +1,14 @@
 def replace_template_name(model, old_name: str, new_name: str):
     """Replace the name of a template in a given model."""
-    if old_name not in {template.name: template for template in model.templates}:
+    template_index = _get_template_index().of(model)
+    positions = template_index.templates_named(old_name)
+    if not positions:
         raise ValueError(f"Template with name {old_name} not found in the given model")
 
-    for template in model.templates:
-        if template.name == old_name:
-            template.name = new_name
+    for position in positions:
+        template = _get_history().writable(model.templates, position)
+        template.name = new_name
+        template_index.update(model, position)
     return model
 
 model = replace_template_name(model, '{{ old_name }}', '{{ new_name }}')
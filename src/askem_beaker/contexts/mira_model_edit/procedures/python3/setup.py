@@ -6,3 +6,4 @@ from mira.metamodel.template_model import Parameter, Distribution , Observable,
     Initial, Concept, TemplateModel
 from mira.metamodel.io import mathml_to_expression
 from sympy.abc import _clash1, _clash2, _clash
+from askem_beaker.lib.mira_edit import get_history as _get_history, get_template_index as _get_template_index, shallow_copy as _shallow_copy
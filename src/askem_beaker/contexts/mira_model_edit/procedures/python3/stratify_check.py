@@ -0,0 +1,2 @@
+from askem_beaker.lib.mira_stratify import check_stratify as _check_stratify
+_check_stratify({{ var_name|default("model") }}, **{{ stratify_kwargs }})
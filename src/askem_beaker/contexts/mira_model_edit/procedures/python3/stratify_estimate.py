@@ -0,0 +1,2 @@
+from askem_beaker.lib.mira_stratify import estimate_stratify as _estimate_stratify
+_estimate_stratify({{ var_name|default("model") }}, **{{ stratify_kwargs }})
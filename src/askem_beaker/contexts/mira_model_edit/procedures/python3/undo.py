@@ -0,0 +1 @@
+{{ var_name|default("model") }} = _get_history("{{ var_name|default("model") }}").undo({{ var_name|default("model") }})
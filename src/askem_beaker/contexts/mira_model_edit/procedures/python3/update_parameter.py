@@ -19,6 +19,14 @@ def update_parameter(model, updated_id: str, replacement_value=None):
     """
     assert isinstance(model, TemplateModel)
     tm = model
+    # Everything that refers to the parameter is changed in place
+    symbol = sympy.Symbol(updated_id)
+    positions = _get_template_index().of(tm).templates_with_parameter(updated_id)
+    for position in positions:
+        _get_history().writable(tm.templates, position)
+    for key, initial in tm.initials.items():
+        if symbol in initial.expression.free_symbols:
+            _get_history().writable(tm.initials, key)
     if replacement_value:
         tm.substitute_parameter(updated_id, replacement_value)
     else:
@@ -29,6 +37,8 @@ def update_parameter(model, updated_id: str, replacement_value=None):
             initial.substitute_parameter(updated_id, replacement_value)
         else:
             initial.substitute_parameter(updated_id, 0)
+    for position in positions:
+        _get_template_index().update(tm, position)
     return tm
 
 
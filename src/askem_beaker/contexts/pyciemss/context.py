@@ -3,7 +3,6 @@ import copy
 import json
 import datetime
 import os
-import requests
 from base64 import b64encode
 from typing import TYPE_CHECKING, Any, Dict
 
@@ -11,6 +10,7 @@ from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.utils import action
 
 from .agent import PyCIEMSSAgent
+from askem_beaker.hmi import get_hmi_client
 from askem_beaker.utils import get_auth
 
 if TYPE_CHECKING:
@@ -21,6 +21,12 @@ if TYPE_CHECKING:
 import logging
 logger = logging.getLogger(__name__)
 
+RESULT_DATA_FILENAMES = {
+    "csv": "result.csv",
+    "gzip": "result.csv.gz",
+    "parquet": "result.parquet",
+}
+
 
 class PyCIEMSSContext(BaseContext):
 
@@ -28,6 +34,7 @@ class PyCIEMSSContext(BaseContext):
 
     def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
         self.auth = get_auth()
+        self.hmi = get_hmi_client()
         super().__init__(beaker_kernel, self.agent_cls, config)
 
     async def setup(self, context_info: dict, parent_header):
@@ -39,11 +46,7 @@ class PyCIEMSSContext(BaseContext):
     async def set_model_config(self, config_id, agent=None, parent_header=None):
         if parent_header is None: parent_header = {}
         self.config_id = config_id
-        meta_url = f"{os.environ['HMI_SERVER_URL']}/model-configurations/as-configured-model/{self.config_id}"
-        self.amr = requests.get(meta_url,
-                                          auth=(os.environ['AUTH_USERNAME'],
-                                                os.environ['AUTH_PASSWORD'])
-                                                ).json()
+        self.amr = (await self.hmi.aget(f"model-configurations/as-configured-model/{self.config_id}")).json()
         logger.info(f"Succeeded in fetching configured model, proceeding.")
         self.schema_name = self.amr.get("header",{}).get("schema_name","petrinet")
         self.original_amr = copy.deepcopy(self.amr)
@@ -74,11 +77,14 @@ class PyCIEMSSContext(BaseContext):
 
     @action()
     async def save_results_to_hmi(self, message):
-        post_url = os.environ["HMI_SERVER_URL"] + "/simulations"
         sim_type = message.content.get("sim_type", "simulate")
+        # Encoding of the tabular outputs: "csv", "gzip" (compressed csv) or "parquet"
+        encoding = message.content.get("encoding", "csv")
+        if encoding not in RESULT_DATA_FILENAMES:
+            raise ValueError(f"Unsupported encoding '{encoding}', expected one of {', '.join(RESULT_DATA_FILENAMES)}")
         auth = self.auth.requests_auth()
         response = await self.evaluate(
-           f"_result_fields()" 
+           f"_result_fields('{encoding}')" 
         )
         result_files = response["return"]
         payload = {
@@ -89,7 +95,7 @@ class PyCIEMSSContext(BaseContext):
             "status": "complete",
             "engine": "ciemss",
         }
-        response = requests.post(post_url, json=payload, auth=auth)
+        response = await self.hmi.apost("simulations", json=payload)
         if response.status_code >= 300:
             raise Exception(
                 (
@@ -99,67 +105,101 @@ class PyCIEMSSContext(BaseContext):
             )
 
         sim_id = response.json()["id"]
-        sim_url = post_url + f"/{sim_id}"
-        payload = requests.get(sim_url, auth=auth).json()
-        result_files = await self.evaluate(
-           f"_save_result('{sim_id}', '{auth.username}', '{auth.password}')" 
-        )
-        assert isinstance(result_files["return"], list)
-
-        if "result.csv" not in result_files["return"]:
-            return {
-                "simulation_id": sim_id,
-                "result_files": result_files["return"]
-            }
-
-
-        dataset_payload = {
-            "name": "Beaker Kernel Results",
-            "temporary": False,
-            "publicAsset": True,
-            "description": "Dataset created in the Beaker Kernel PyCIEMSS Context",
-            "fileNames": [
-                "result.csv"
-            ],
-            "columns": [
-            ],
-            "metadata": {},
-            "source": "beaker-kernel",
-            "grounding": {
-                "identifiers": {},
-                "context": {}
-            }
-        }
-
-        dataservice_url = os.environ["HMI_SERVER_URL"] + "/datasets"
-        create_req = requests.post(dataservice_url, auth=auth, json=dataset_payload)
-        dataset_id = create_req.json()["id"]
-        dataset_url = dataservice_url + f"/{dataset_id}"
-        data_url_req = requests.get(f"{dataset_url}/upload-url?filename=result.csv", auth=auth)
-        data_url = data_url_req.json().get('url', None)
-        code = self.get_code(
-            "df_save_as",
-            {
-                "data_url": data_url,
+        payload = (await self.hmi.aget(f"simulations/{sim_id}")).json()
+
+        # The sample dataframe is serialized once and the same file uploaded to both the simulation and a new
+        # dataset, so the dataset has to exist before the results are saved.
+        data_filename = RESULT_DATA_FILENAMES[encoding]
+        dataset_id = None
+        extra_upload_urls = {}
+        if data_filename in result_files:
+            dataset_payload = {
+                "name": "Beaker Kernel Results",
+                "temporary": False,
+                "publicAsset": True,
+                "description": "Dataset created in the Beaker Kernel PyCIEMSS Context",
+                "fileNames": [
+                    data_filename
+                ],
+                "columns": [
+                ],
+                "metadata": {},
+                "source": "beaker-kernel",
+                "grounding": {
+                    "identifiers": {},
+                    "context": {}
+                }
             }
-        )
-        kernel_response = await self.execute(code) # TODO: Check error
 
-        add_asset_url = os.environ["HMI_SERVER_URL"] + f"/projects/{message.content['project_id']}/assets/dataset/{dataset_id}"
-        response = requests.post(add_asset_url, auth=auth)
-        if response.status_code >= 300:
-            raise Exception(
-                (
-                    "Failed to add dataset as asset ({add_asset_url}) "
-                    f"(reason: {response.reason}({response.status_code}) - {json.dumps(payload)}"
+            create_req = await self.hmi.apost("datasets", json=dataset_payload)
+            if create_req.status_code >= 300:
+                raise Exception(
+                    (
+                        "Failed to create dataset on HMI "
+                        f"(reason: {create_req.reason}({create_req.status_code}) - {json.dumps(dataset_payload)}"
+                    )
                 )
+            dataset_id = create_req.json()["id"]
+
+        try:
+            if dataset_id is not None:
+                data_url_req = await self.hmi.aget(f"datasets/{dataset_id}/upload-url", params={"filename": data_filename})
+                data_url = data_url_req.json().get("url", None) if data_url_req.status_code < 300 else None
+                if not data_url:
+                    raise Exception(
+                        (
+                            f"Failed to get an upload url for dataset {dataset_id} "
+                            f"(reason: {data_url_req.reason}({data_url_req.status_code}))"
+                        )
+                    )
+                extra_upload_urls[data_filename] = [data_url]
+
+            saved = await self.evaluate(
+               f"_save_result('{sim_id}', '{auth.username}', '{auth.password}', encoding='{encoding}', "
+               f"extra_upload_urls={extra_upload_urls!r})"
             )
+            saved = (saved or {}).get("return", None)
+            if not isinstance(saved, dict):
+                raise Exception(f"Failed to save the results of simulation {sim_id} to HMI")
+            logger.info(f"Saved simulation {sim_id} result files: {saved['timings']}")
+            self.beaker_kernel.debug("pyciemss_save_timings", saved["timings"])
+
+            if dataset_id is None:
+                return {
+                    "simulation_id": sim_id,
+                    "result_files": saved["files"],
+                    "timings": saved["timings"],
+                }
+
+            add_asset_path = f"projects/{message.content['project_id']}/assets/dataset/{dataset_id}"
+            response = await self.hmi.apost(add_asset_path)
+            if response.status_code >= 300:
+                raise Exception(
+                    (
+                        f"Failed to add dataset as asset ({add_asset_path}) "
+                        f"(reason: {response.reason}({response.status_code}) - {json.dumps(payload)}"
+                    )
+                )
+        except Exception:
+            # Don't leave behind a dataset whose file never made it to the server
+            if dataset_id is not None:
+                await self.delete_dataset(dataset_id)
+            raise
 
         return {
             "dataset_id": dataset_id,
             "simulation_id": sim_id,
+            "timings": saved["timings"],
         }
 
+    async def delete_dataset(self, dataset_id):
+        try:
+            response = await self.hmi.adelete(f"datasets/{dataset_id}")
+            if response.status_code >= 300:
+                logger.error(f"Failed to delete dataset {dataset_id} (reason: {response.reason}({response.status_code}))")
+        except Exception as e:
+            logger.error(f"Failed to delete dataset {dataset_id}: {e}")
+
     save_results_to_hmi._default_payload = '{\n\t"project_id": "a22f4865-c979-4ca2-aae0-5c9afc81b72a"\n}'
 
 
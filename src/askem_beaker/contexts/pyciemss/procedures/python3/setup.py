@@ -1,6 +1,9 @@
 import pyciemss
 import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 import json, dill
 import torch
@@ -31,97 +34,121 @@ def obs_nday_average_qoi(
     return np.mean(dataQoI[:, -ndays:], axis=1)
 
 
-def _result_fields() -> list[str]:
-    result_exists = "result" in vars() or "result" in globals()
-    if not (result_exists and isinstance(result, dict)):
-        return []
+_TABULAR_EXTENSIONS = {"csv": "csv", "gzip": "csv.gz", "parquet": "parquet"}
+_UPLOAD_WORKERS = int(os.environ.get("PYCIEMSS_UPLOAD_WORKERS", 4))
+
 
-    mapping = {
-       "data": "result.csv", 
+def _result_filenames(encoding: str = "csv") -> dict[str, str]:
+    if encoding not in _TABULAR_EXTENSIONS:
+        raise ValueError(f"Unsupported encoding '{encoding}', expected one of {', '.join(_TABULAR_EXTENSIONS)}")
+    extension = _TABULAR_EXTENSIONS[encoding]
+    return {
+       "data": f"result.{extension}",
        "risk": "risk.json",
-       "eval": "eval.csv",
+       "quantiles": f"eval.{extension}",
        "inferred_parameters": "parameters.dill",
        "policy": "policy.json",
        "OptResults": "optimize_results.json", # excluding the optimize_results.dill for now.
        "visual": "visualization.json",
     }
-    to_filename = lambda key: mapping[key] if key in result else None
-    return [to_filename(key) for key in mapping.keys() if to_filename(key) is not None]
-   
+
+
+def _result_fields(encoding: str = "csv") -> list[str]:
+    result_exists = "result" in vars() or "result" in globals()
+    if not (result_exists and isinstance(result, dict)):
+        return []
+
+    mapping = _result_filenames(encoding)
+    return [mapping[key] for key in mapping.keys() if key in result]
+
+
+def _write_table(df, filename, encoding):
+    if encoding == "parquet":
+        df.to_parquet(filename, index=False)
+    elif encoding == "gzip":
+        df.to_csv(filename, index=False, compression="gzip")
+    else:
+        df.to_csv(filename, index=False)
+
+
+def _write_json(obj, filename, **kwargs):
+    with open(filename, "w") as f:
+        json.dump(obj, f, **kwargs)
+
+
+def _write_dill(obj, filename):
+    with open(filename, "wb") as file:
+        dill.dump(obj, file)
+
+
+def _write_risk(risk_result, filename):
+    # Update qoi (tensor) to a list before serializing with json.dumps
+    for k, v in risk_result.items():
+        risk_result[k]["qoi"] = v["qoi"].tolist()
+    json_obj = json.loads(json.dumps(risk_result, default=str))
+    _write_json(json_obj, filename, ensure_ascii=False, indent=4)
+
+
+def _write_optimize_results(results, filename):
+    _write_json(json.loads(json.dumps(results, default=str)), filename, ensure_ascii=False, indent=4)
+
+
 # adapted from the pyciemss-service
-def _save_result(job_id, username, password):
+def _save_result(job_id, username, password, encoding="csv", extra_upload_urls=None):
+    """
+    Serializes each result once and uploads it to the simulation, and also to any presigned urls listed for its
+    filename in `extra_upload_urls` (e.g. a dataset created from the sample data).
+    """
     result_exists = "result" in vars() or "result" in globals()
     if not (result_exists and isinstance(result, dict)):
         return
-    auth = HTTPBasicAuth(username, password)
     sim_results_url = os.environ["HMI_SERVER_URL"] + "/simulations/" + str(job_id)
-    files = {}
-
-    output_filename = "./result.csv"
-    data_result = result.get("data", None)
-    if data_result is not None:
-        data_result.to_csv(output_filename, index=False)
-        files[output_filename] = "result.csv"
-
-    risk_result = result.get("risk", None)
-    if risk_result is not None:
-        # Update qoi (tensor) to a list before serializing with json.dumps
-        for k, v in risk_result.items():
-            risk_result[k]["qoi"] = v["qoi"].tolist()
-        risk_json_obj = json.dumps(risk_result, default=str)
-        json_obj = json.loads(risk_json_obj)
-        json_filename = "./risk.json"
-        with open(json_filename, "w") as f:
-            json.dump(json_obj, f, ensure_ascii=False, indent=4)
-        files[json_filename] = "risk.json"
-
-    eval_output_filename = "./eval.csv"
-    eval_result = result.get("quantiles", None)
-    if eval_result is not None:
-        eval_result.to_csv(eval_output_filename, index=False)
-        files[eval_output_filename] = "eval.csv"
-
-    params_filename = "./parameters.dill"
-    params_result = result.get("inferred_parameters", None)
-    if params_result is not None:
-        with open(params_filename, "wb") as file:
-            dill.dump(params_result, file)
-        files[params_filename] = "parameters.dill"
-
-    policy_filename = "./policy.json"
-    policy = result.get("policy", None)
-    if policy is not None:
-        with open(policy_filename, "w") as file:
-            json.dump(policy.tolist(), file)
-        files[policy_filename] = "policy.json"
-
-    results_filename = "./optimize_results.dill"
-    results = result.get("OptResults", None)
-    if results is not None:
-        json_obj = json.loads(json.dumps(results, default=str))
-        json_filename = "./optimize_result.json"
-        with open(json_filename, "w") as f:
-            json.dump(json_obj, f, ensure_ascii=False, indent=4)
-        files[json_filename] = "optimize_results.json"
-
-        with open(results_filename, "wb") as file:
-            dill.dump(results, file)
-        files[results_filename] = "optimize_results.dill"
-
-    visualization_filename = "./visualization.json"
-    viz_result = result.get("visual", None)
-    if viz_result is not None:
-        with open(visualization_filename, "w") as f:
-            json.dump(viz_result, f, indent=2)
-        files[visualization_filename] = "visualization.json"
-
-    for location, handle in files.items():
-        upload_url = f"{sim_results_url}/upload-url?filename={handle}"
-        upload_response = requests.get(upload_url, auth=auth)
-        presigned_upload_url = upload_response.json()["url"]
-
-        with open(location, "rb") as f:
-            upload_response = requests.put(presigned_upload_url, f)
+    filenames = _result_filenames(encoding)
+    writers = {
+        "data": lambda obj, filename: _write_table(obj, filename, encoding),
+        "risk": _write_risk,
+        "quantiles": lambda obj, filename: _write_table(obj, filename, encoding),
+        "inferred_parameters": _write_dill,
+        "policy": lambda obj, filename: _write_json(obj.tolist(), filename),
+        "OptResults": _write_optimize_results,
+        "visual": lambda obj, filename: _write_json(obj, filename, indent=2),
+    }
+    # (local path, upload handle, result object, writer)
+    outputs = [
+        (f"./{filenames[key]}", filenames[key], result[key], writer)
+        for key, writer in writers.items()
+        if result.get(key, None) is not None
+    ]
+    if result.get("OptResults", None) is not None:
+        outputs.append(("./optimize_results.dill", "optimize_results.dill", result["OptResults"], _write_dill))
+
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(username, password)
+    adapter = HTTPAdapter(pool_connections=_UPLOAD_WORKERS, pool_maxsize=_UPLOAD_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    extra_upload_urls = extra_upload_urls or {}
+
+    def serialize_and_upload(location, handle, obj, writer):
+        start = time.perf_counter()
+        writer(obj, location)
+        serialized = time.perf_counter()
+
+        upload_response = session.get(f"{sim_results_url}/upload-url", params={"filename": handle})
+        upload_url = upload_response.json().get("url") if upload_response.status_code < 300 else None
+        presigned_upload_urls = [upload_url, *extra_upload_urls.get(handle, [])]
+        if not all(presigned_upload_urls):
+            raise Exception(
+                (
+                    "Failed to get an upload url from HMI "
+                    f"(status: {upload_response.status_code}): {handle}"
+                )
+            )
+        for presigned_upload_url in presigned_upload_urls:
+            # Passing the open file streams it from disk rather than reading it into memory first.
+            with open(location, "rb") as f:
+                upload_response = requests.put(presigned_upload_url, data=f)
             if upload_response.status_code >= 300:
                 raise Exception(
                     (
@@ -129,5 +156,17 @@ def _save_result(job_id, username, password):
                         f"(status: {upload_response.status_code}): {handle}"
                     )
                 )
-
-    return list(files.values())
+        return {
+            "size": os.path.getsize(location),
+            "serialize": serialized - start,
+            "upload": time.perf_counter() - serialized,
+        }
+
+    with ThreadPoolExecutor(max_workers=_UPLOAD_WORKERS) as pool:
+        futures = {output[1]: pool.submit(serialize_and_upload, *output) for output in outputs}
+        timings = {handle: future.result() for handle, future in futures.items()}
+
+    return {
+        "files": list(timings.keys()),
+        "timings": timings,
+    }
@@ -1,14 +1,14 @@
+import asyncio
 import json
 import logging
 import os
 from typing import TYPE_CHECKING, Any, Dict
 
-import requests
-
 from beaker_kernel.lib.context import BaseContext
 from beaker_kernel.lib.utils import action
 
 from .agent import DecapodesAgent
+from askem_beaker.hmi import get_hmi_client
 from askem_beaker.utils import get_auth
 from beaker_kernel.lib.subkernels.julia import JuliaSubkernel
 
@@ -28,6 +28,7 @@ class DecapodesContext(BaseContext):
     def __init__(self, beaker_kernel: "LLMKernel", config: Dict[str, Any]) -> None:
         self.target = "decapode"
         self.auth = get_auth()
+        self.hmi = get_hmi_client()
         self.reset()
         super().__init__(beaker_kernel, self.agent_cls, config)
         if not isinstance(self.subkernel, JuliaSubkernel):
@@ -38,17 +39,15 @@ class DecapodesContext(BaseContext):
     async def setup(self, context_info, parent_header):
         self.config["context_info"] = context_info
 
-        def fetch_model(model_id):
-            meta_url = f"{os.environ['HMI_SERVER_URL']}/models/{model_id}"
-            response = requests.get(meta_url, auth=self.auth.requests_auth())
+        async def fetch_model(model_id):
+            response = await self.hmi.aget(f"models/{model_id}")
             if response.status_code >= 300:
                 raise Exception(f"Failed to retrieve model {model_id} from server returning {response.status_code}")
             model = json.dumps(response.json()["model"])
             return model
 
-        variables = {
-            var_name: fetch_model(decapode_id) for var_name, decapode_id in context_info.items()
-        }
+        models = await asyncio.gather(*(fetch_model(decapode_id) for decapode_id in context_info.values()))
+        variables = dict(zip(context_info.keys(), models))
 
         command = "\n".join(
             [
@@ -246,10 +245,7 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
             "annotations": [],
         }
 
-        create_req = requests.post(
-            f"{os.environ['HMI_SERVER_URL']}/models", json=amr,
-            auth=self.auth.requests_auth()
-        )
+        create_req = await self.hmi.apost("models", json=amr)
         new_model_id = create_req.json()["id"]
         logger.debug(f"Created model {new_model_id}")
 
@@ -327,7 +323,6 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
         description = content.get("description", "")
         filename = content.get("filename", None)
         soln_name = content.get("soln_name", "soln")
-        dataservice_url = os.environ["HMI_SERVER_URL"]
 
         if filename is None:
             filename = "dataset.csv"
@@ -340,15 +335,14 @@ If you are asked to manipulate, stratify, or visualize the model, use the genera
 
         import pprint
         logger.debug(f"Creating dataset {pprint.pformat(new_dataset)}")
-        create_req = requests.post(f"{dataservice_url}/datasets", auth=self.auth.requests_auth(), json=new_dataset)
+        create_req = await self.hmi.apost("datasets", json=new_dataset)
         new_dataset_id = create_req.json()["id"]
 
         new_dataset["id"] = new_dataset_id
         logger.debug(f"Dataset created: {new_dataset_id}")
 
         logger.debug(f"Uploading {filename} to {new_dataset_id}")
-        new_dataset_url = f"{dataservice_url}/datasets/{new_dataset_id}"
-        data_url_req = requests.get(f"{new_dataset_url}/upload-url?filename={filename}", auth=self.auth.requests_auth())
+        data_url_req = await self.hmi.aget(f"datasets/{new_dataset_id}/upload-url", params={"filename": filename})
         data_url = data_url_req.json().get('url', None)
         logger.debug(f"`{filename}` uploaded")
 
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from askem_beaker.utils import TerariumAuth, get_auth
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+# Path segments that identify a specific asset are collapsed so metrics are grouped per endpoint, not per asset.
+_ID_SEGMENT = re.compile(r"^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$")
+
+
+class EndpointStats:
+    count: int
+    errors: int
+    total: float
+    max: float
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float, error: bool = False) -> None:
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if error:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "total": self.total,
+        }
+
+
+class HMIClient:
+    """
+    Pooled client for the HMI server.
+
+    Requests are made through a single `requests.Session` so connections are kept alive between calls, with
+    retries and backoff for transient failures and a default timeout. The `a*` methods run the same requests in
+    worker threads, with at most `max_concurrency` in flight at once, so they never block the kernel's event loop.
+    The latency of every call is recorded per endpoint and available from `metrics()`.
+    """
+
+    auth: Optional[TerariumAuth]
+    max_concurrency: int
+    timeout: float
+    stats: Dict[str, EndpointStats]
+
+    def __init__(
+        self,
+        auth: Optional[TerariumAuth] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+    ) -> None:
+        self.auth = auth if auth is not None else get_auth()
+        self._base_url = base_url
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get("HMI_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        if timeout is None:
+            timeout = float(os.environ.get("HMI_TIMEOUT", DEFAULT_TIMEOUT))
+        if retries is None:
+            retries = int(os.environ.get("HMI_RETRIES", DEFAULT_RETRIES))
+        if backoff is None:
+            backoff = float(os.environ.get("HMI_RETRY_BACKOFF", DEFAULT_BACKOFF))
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.stats = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # POST is left out of the retried methods as creating an asset twice is worse than failing once.
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.max_concurrency, pool_maxsize=self.max_concurrency, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.auth is not None:
+            self.session.auth = self.auth.requests_auth()
+
+    @property
+    def base_url(self) -> str:
+        return (self._base_url or os.environ["HMI_SERVER_URL"]).rstrip("/")
+
+    def url(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    @staticmethod
+    def endpoint(method: str, path: str) -> str:
+        path = path.split("?", 1)[0]
+        if path.startswith(("http://", "https://")):
+            path = "/" + path.split("/", 3)[-1]
+        segments = ["{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.strip("/").split("/")]
+        return f"{method.upper()} /{'/'.join(segments)}"
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = self.endpoint(method, path)
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats.setdefault(endpoint, EndpointStats()).record(elapsed, error=failed)
+            logger.debug(f"{endpoint} took {elapsed:.3f}s")
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", path, **kwargs)
+
+    async def arequest(self, method: str, path: str, **kwargs) -> requests.Response:
+        async with self._semaphore:
+            return await asyncio.to_thread(self.request, method, path, **kwargs)
+
+    async def aget(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("GET", path, **kwargs)
+
+    async def apost(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("POST", path, **kwargs)
+
+    async def aput(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("PUT", path, **kwargs)
+
+    async def adelete(self, path: str, **kwargs) -> requests.Response:
+        return await self.arequest("DELETE", path, **kwargs)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint: stats.to_dict() for endpoint, stats in self.stats.items()}
+
+
+_client: Optional[HMIClient] = None
+
+
+def get_hmi_client() -> HMIClient:
+    """
+    Returns the HMI client shared by every context in this process.
+    """
+    global _client
+    if _client is None:
+        _client = HMIClient()
+    return _client
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import chromadb
+
+from .embeddings import CachedEmbeddingFunction
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 256
+MANIFEST_FILENAME = "manifest.json"
+
+
+class LRUCache:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            if key in self._items:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+class ChromaRegistry:
+    """
+    Process-wide ChromaDB clients and collections for the agents' example and documentation lookups.
+
+    Each persistent directory is opened once and its collections are kept for the life of the process. Queries are
+    embedded with a `CachedEmbeddingFunction`, which persists vectors across sessions, and query results are cached
+    by (collection, query, n_results), so repeated lookups don't touch the index or the embedding model again.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None) -> None:
+        if cache_size is None:
+            cache_size = int(os.environ.get("CHROMA_QUERY_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+        self._clients: Dict[str, Any] = {}
+        self._collections: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._embedding_function = None
+        self.results = LRUCache(cache_size)
+        self.load_times: Dict[str, float] = {}
+
+    @property
+    def embedding_function(self) -> CachedEmbeddingFunction:
+        # The warmup thread and the first query can both get here first; only one of them may load the model
+        with self._lock:
+            if self._embedding_function is None:
+                self._embedding_function = CachedEmbeddingFunction()
+            return self._embedding_function
+
+    def client(self, path: str):
+        with self._lock:
+            if path not in self._clients:
+                self._clients[path] = chromadb.PersistentClient(path=path)
+                logger.info(f"Opened ChromaDB at {path}")
+            return self._clients[path]
+
+    def collection(self, name: str, path: str):
+        key = (path, name)
+        if key not in self._collections:
+            collection = self.client(path).get_or_create_collection(
+                name=name, embedding_function=self.embedding_function
+            )
+            with self._lock:
+                self._collections.setdefault(key, collection)
+        return self._collections[key]
+
+    def embed(self, text: str) -> List[float]:
+        return self.embedding_function([text])[0]
+
+    def query(self, collection_name: str, path: str, query: str, n_results: int = 5) -> Dict[str, Any]:
+        key = (path, collection_name, query, n_results)
+        result = self.results.get(key)
+        if result is None:
+            result = self.collection(collection_name, path).query(
+                query_embeddings=[self.embed(query)], n_results=n_results
+            )
+            self.results.put(key, result)
+        return result
+
+    def get(self, collection_name: str, path: str, ids: List[str]) -> Dict[str, Any]:
+        key = (path, collection_name, "ids", tuple(ids))
+        result = self.results.get(key)
+        if result is None:
+            result = self.collection(collection_name, path).get(ids=ids)
+            self.results.put(key, result)
+        return result
+
+    def warmup(self, path: str) -> float:
+        """
+        Opens the index at `path` and runs a query against each of its collections, so the embedding model and HNSW
+        segments are loaded before the first real lookup. Returns, and records in `load_times`, how long that took.
+        """
+        start = time.perf_counter()
+        if not verify_index(path):
+            logger.warning(f"ChromaDB index at {path} does not match its manifest")
+        embedding = self.embed("warmup")
+        for collection_info in self.client(path).list_collections():
+            collection = self.collection(collection_info.name, path)
+            if collection.count():
+                collection.query(query_embeddings=[embedding], n_results=1)
+        self.load_times[path] = time.perf_counter() - start
+        logger.info(f"Warmed up ChromaDB at {path} in {self.load_times[path]:.3f}s")
+        return self.load_times[path]
+
+    def warmup_in_background(self, path: str) -> Optional[threading.Thread]:
+        if path in self.load_times or not os.path.isdir(path):
+            return None
+        thread = threading.Thread(target=self.warmup, args=(path,), name=f"chroma-warmup-{path}", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.embedding_function.stats(),
+            "results": self.results.stats(),
+            "load_times": self.load_times,
+        }
+
+
+_registry: Optional[ChromaRegistry] = None
+
+
+def get_chroma() -> ChromaRegistry:
+    """
+    Returns the ChromaDB registry shared by every context in this process.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ChromaRegistry()
+    return _registry
+
+
+def _index_files(path: str) -> Dict[str, int]:
+    files = {}
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            relative_path = os.path.relpath(full_path, path)
+            # The sqlite database is written to whenever the index is opened, so only the HNSW segments are tracked
+            if relative_path != MANIFEST_FILENAME and not relative_path.startswith("chroma.sqlite3"):
+                files[relative_path] = os.path.getsize(full_path)
+    return files
+
+
+def verify_index(path: str) -> bool:
+    """
+    Checks an unpacked index against the manifest written by `unpack_index`. Indexes without a manifest pass.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return True
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    return os.path.exists(os.path.join(path, "chroma.sqlite3")) and _index_files(path) == manifest["files"]
+
+
+def unpack_index(zip_path: str, dest: str) -> None:
+    """
+    Unpacks one of the `resources/chromadb_functions_*.zip` indexes to `dest`, warms it up so its HNSW segments are
+    built and persisted, then writes a manifest that `verify_index` checks at startup. Does nothing if `dest` already
+    holds an index unpacked from the same zip.
+    """
+    sha = hashlib.sha256()
+    with open(zip_path, "rb") as zip_file:
+        for chunk in iter(lambda: zip_file.read(1024 * 1024), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    manifest_path = os.path.join(dest, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path) and verify_index(dest):
+        with open(manifest_path) as manifest_file:
+            if json.load(manifest_file).get("sha256") == digest:
+                logger.info(f"{dest} is already unpacked from {zip_path}")
+                return
+
+    with zipfile.ZipFile(zip_path) as archive:
+        corrupt = archive.testzip()
+        if corrupt is not None:
+            raise ValueError(f"{zip_path} is corrupt: {corrupt}")
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(dest)))
+        archive.extractall(tmp_dir)
+    # The archives hold a single top level directory
+    (top_level,) = os.listdir(tmp_dir)
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    os.replace(os.path.join(tmp_dir, top_level), dest)
+    os.rmdir(tmp_dir)
+
+    load_time = get_chroma().warmup(dest)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump({"source": os.path.basename(zip_path), "sha256": digest, "files": _index_files(dest)}, manifest_file)
+    print(f"Unpacked {zip_path} to {dest} (warmup took {load_time:.3f}s)")
+
+
+if __name__ == "__main__":
+    # e.g. `python -m askem_beaker.lib.chroma resources/chromadb_functions_chirho.zip /home/jupyter/chromadb_functions_chirho`
+    unpack_index(sys.argv[1], sys.argv[2])
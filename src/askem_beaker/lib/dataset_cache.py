@@ -0,0 +1,196 @@
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "~/.cache/askem_beaker/datasets"
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+CHUNK_SIZE = 1024 * 1024
+
+
+class DatasetCache:
+    """
+    On-disk cache of files downloaded from the HMI server, shared by every kernel session on the machine.
+
+    Entries are keyed by the asset's id and filename and hold the ETag and Last-Modified headers of the response they
+    came from, so later fetches are conditional GETs that only transfer the file when it changed. File contents are
+    stored once per sha256 digest, along with any files derived from them (see `derived_path`). Once the cache grows
+    past `max_bytes` the least recently used entries are evicted.
+    """
+
+    cache_dir: str
+    max_bytes: int
+    hits: int
+    misses: int
+    bytes_saved: int
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None) -> None:
+        if cache_dir is None:
+            cache_dir = os.environ.get("DATASET_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("DATASET_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    @staticmethod
+    def key(asset_id: str, filename: str) -> str:
+        return f"{asset_id}/{filename}"
+
+    @contextmanager
+    def _locked_index(self):
+        # Other kernels may share the cache, so the index is only read and rewritten while holding the lock.
+        with open(os.path.join(self.cache_dir, "index.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.index_path) as index_file:
+                        index = json.load(index_file)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    index = {}
+                yield index
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                with os.fdopen(fd, "w") as index_file:
+                    json.dump(index, index_file)
+                os.replace(tmp_path, self.index_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest)
+
+    def derived_path(self, path: str, suffix: str) -> str:
+        """
+        Returns where to keep a file derived from the cached file at `path` (e.g. a parquet copy of a CSV). Derived
+        files are evicted along with the file they came from.
+        """
+        return f"{path}{suffix}"
+
+    def fetch(self, url: str, asset_id: str, filename: str, **kwargs) -> str:
+        """
+        Returns the path of a local copy of the file at `url`, downloading it only if the cached copy is missing or
+        stale. Extra keyword arguments are passed through to `requests.get`.
+        """
+        key = self.key(asset_id, filename)
+        headers = dict(kwargs.pop("headers", None) or {})
+        kwargs.setdefault("timeout", 60)
+        conditional = True
+        while True:
+            with self._locked_index() as index:
+                entry = index.get(key) if conditional else None
+                if entry and not os.path.exists(self.blob_path(entry["digest"])):
+                    entry = None
+
+            request_headers = dict(headers)
+            if entry:
+                # Only validators the server gave are sent back, so it never answers 304 to a date it didn't issue
+                if entry.get("etag"):
+                    request_headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    request_headers["If-Modified-Since"] = entry["last_modified"]
+
+            with requests.get(url, headers=request_headers, stream=True, **kwargs) as response:
+                if entry and response.status_code == 304:
+                    self.hits += 1
+                    self.bytes_saved += entry["size"]
+                    digest = entry["digest"]
+                    logger.info(f"Dataset cache hit for '{key}'")
+                else:
+                    response.raise_for_status()
+                    self.misses += 1
+                    digest, size = self._store(response)
+                    entry = {
+                        "digest": digest,
+                        "size": size,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+                    logger.info(f"Dataset cache miss for '{key}', stored {size} bytes")
+
+            with self._locked_index() as index:
+                # Another kernel may have evicted the file since it was checked, in which case it is fetched again
+                if os.path.exists(self.blob_path(digest)):
+                    index[key] = {**entry, "accessed": time.time()}
+                    self._evict(index)
+                    return self.blob_path(digest)
+                index.pop(key, None)
+            if not conditional:
+                raise FileNotFoundError(f"Cached copy of '{key}' was evicted while it was being stored")
+            logger.info(f"Cached copy of '{key}' was evicted while it was being fetched, downloading it again")
+            conditional = False
+
+    def _store(self, response: requests.Response):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            os.replace(tmp_path, self.blob_path(digest.hexdigest()))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest.hexdigest(), size
+
+    def _files_size(self, digest: str) -> int:
+        return sum(os.path.getsize(path) for path in glob.glob(f"{self.blob_path(digest)}*"))
+
+    def _evict(self, index: Dict[str, Any]) -> None:
+        digests = {entry["digest"] for entry in index.values()}
+        total = sum(self._files_size(digest) for digest in digests)
+        for key in sorted(index, key=lambda key: index[key]["accessed"]):
+            if total <= self.max_bytes or len(index) <= 1:
+                break
+            digest = index.pop(key)["digest"]
+            # Identical files uploaded under different names share one copy, which stays until nothing refers to it.
+            if any(entry["digest"] == digest for entry in index.values()):
+                continue
+            total -= self._files_size(digest)
+            for path in glob.glob(f"{self.blob_path(digest)}*"):
+                os.remove(path)
+            logger.info(f"Evicted '{key}' from the dataset cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._locked_index() as index:
+            entries = len(index)
+            size = sum(self._files_size(digest) for digest in {entry["digest"] for entry in index.values()})
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+            "entries": entries,
+            "size": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache: Optional[DatasetCache] = None
+
+
+def get_dataset_cache() -> DatasetCache:
+    """
+    Returns the dataset cache shared by everything in this process.
+    """
+    global _cache
+    if _cache is None:
+        _cache = DatasetCache()
+    return _cache
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+from importlib import import_module
+from importlib.metadata import PackageNotFoundError, version
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "~/.cache/askem_beaker/docs"
+
+_help_texts: Dict[Tuple[str, str], str] = {}
+
+
+def package_version(package: str) -> str:
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return str(getattr(import_module(package), "__version__", "unknown"))
+
+
+def cache_dir() -> str:
+    return os.path.expanduser(os.environ.get("ASKEM_BEAKER_DOCS_DIR", DEFAULT_CACHE_DIR))
+
+
+def search_dirs() -> List[str]:
+    # Docs built into the wheel at install time are checked after the user's cache.
+    return [cache_dir(), os.path.join(sys.prefix, "share", "beaker", "docs")]
+
+
+def doc_filename(package: str, pkg_version: str) -> str:
+    return f"{package}-{pkg_version}.txt"
+
+
+def build_help_text(package: str) -> str:
+    module = import_module(package)
+    # Redirect the standard output to capture the help text
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        help(module)
+        return buf.getvalue()
+
+
+def write_help_text(package: str, dest_dir: Optional[str] = None) -> str:
+    """
+    Builds the help text of an installed package and writes it to `dest_dir` (the user's cache by default), returning
+    the path written.
+    """
+    dest_dir = dest_dir or cache_dir()
+    os.makedirs(dest_dir, exist_ok=True)
+    path = os.path.join(dest_dir, doc_filename(package, package_version(package)))
+    text = build_help_text(package)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as doc_file:
+        doc_file.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_help_text(package: str) -> str:
+    """
+    Returns the output of `help()` for a package. The text is cached in memory and on disk by package name and
+    version, so it is only generated once per installed version rather than once per kernel or prompt.
+    """
+    key = (package, package_version(package))
+    if key in _help_texts:
+        return _help_texts[key]
+
+    filename = doc_filename(*key)
+    for directory in search_dirs():
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            with open(path) as doc_file:
+                _help_texts[key] = doc_file.read()
+            return _help_texts[key]
+
+    try:
+        path = write_help_text(package)
+        with open(path) as doc_file:
+            _help_texts[key] = doc_file.read()
+    except OSError:
+        logger.exception(f"Unable to cache documentation for {package}")
+        _help_texts[key] = build_help_text(package)
+    return _help_texts[key]
+
+
+if __name__ == "__main__":
+    # Prebuilds the documentation cache, e.g. `python -m askem_beaker.lib.docs mira chirho`
+    for package_name in sys.argv[1:]:
+        print(f"Wrote {write_help_text(package_name)}")
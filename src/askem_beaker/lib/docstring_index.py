@@ -0,0 +1,139 @@
+import importlib
+import logging
+import os
+import pkgutil
+import sqlite3
+import sys
+from typing import Dict, Optional
+
+from .docs import package_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "~/.cache/askem_beaker/docstrings.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docstrings (
+    version TEXT NOT NULL,
+    module TEXT NOT NULL,
+    name TEXT NOT NULL,
+    docstring TEXT NOT NULL,
+    PRIMARY KEY (version, name)
+);
+CREATE INDEX IF NOT EXISTS docstrings_module ON docstrings (version, module);
+CREATE TABLE IF NOT EXISTS indexed_modules (
+    version TEXT NOT NULL,
+    module TEXT NOT NULL,
+    PRIMARY KEY (version, module)
+);
+"""
+
+
+def _module_docstrings(modname: str) -> Dict[str, str]:
+    result = {}
+    submodule = importlib.import_module(modname)
+    for attribute_name in dir(submodule):
+        if attribute_name.startswith("_"):
+            continue
+        attribute = getattr(submodule, attribute_name)
+        if getattr(attribute, "__doc__", None):
+            result[f"{modname}.{attribute_name}"] = attribute.__doc__
+    return result
+
+
+class DocstringIndex:
+    """
+    On-disk SQLite index of the docstrings of every public attribute of a package's modules.
+
+    Rows are keyed by the installed version of the package they belong to, so upgrading a library never serves stale
+    docs. Modules are indexed lazily, one requested subtree at a time, and queries for a module return only the
+    docstrings of that module and its submodules.
+    """
+
+    path: str
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        if path is None:
+            path = os.environ.get("DOCSTRING_INDEX_PATH", DEFAULT_INDEX_PATH)
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.executescript(SCHEMA)
+
+    @staticmethod
+    def version_key(module_name: str) -> str:
+        root = module_name.split(".")[0]
+        return f"{root}=={package_version(root)}"
+
+    def is_indexed(self, module_name: str, version: str) -> bool:
+        # A module is covered if it, or any package it belongs to, was indexed for this version.
+        parts = module_name.split(".")
+        ancestors = [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
+        placeholders = ", ".join("?" for _ in ancestors)
+        row = self.connection.execute(
+            f"SELECT 1 FROM indexed_modules WHERE version = ? AND module IN ({placeholders}) LIMIT 1",
+            [version, *ancestors],
+        ).fetchone()
+        return row is not None
+
+    def index(self, module_name: str, version: Optional[str] = None) -> None:
+        """
+        Imports a module and all of its submodules and stores their docstrings.
+        """
+        version = version or self.version_key(module_name)
+        module = importlib.import_module(module_name)
+        modnames = [module_name]
+        if hasattr(module, "__path__"):
+            modnames.extend(modname for _, modname, _ in pkgutil.walk_packages(module.__path__, f"{module_name}."))
+
+        rows = []
+        for modname in modnames:
+            try:
+                docstrings = _module_docstrings(modname)
+            except Exception:
+                # Skip modules that can't be imported
+                continue
+            rows.extend((version, modname, name, docstring) for name, docstring in docstrings.items())
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO docstrings VALUES (?, ?, ?, ?)", rows)
+            self.connection.execute("INSERT OR REPLACE INTO indexed_modules VALUES (?, ?)", (version, module_name))
+        logger.info(f"Indexed {len(rows)} docstrings from {len(modnames)} modules under {module_name}")
+
+    def get_docstrings(self, module_name: str) -> Dict[str, str]:
+        """
+        Returns `{full_name: docstring}` for the public attributes of a module and its submodules, indexing them
+        first if needed.
+        """
+        version = self.version_key(module_name)
+        if not self.is_indexed(module_name, version):
+            self.index(module_name, version)
+        prefix = f"{module_name}."
+        rows = self.connection.execute(
+            "SELECT name, docstring FROM docstrings "
+            "WHERE version = ? AND (module = ? OR substr(module, 1, ?) = ?) ORDER BY name",
+            (version, module_name, len(prefix), prefix),
+        )
+        return dict(rows)
+
+
+_index: Optional[DocstringIndex] = None
+
+
+def get_docstring_index() -> DocstringIndex:
+    """
+    Returns the docstring index shared by everything in this process.
+    """
+    global _index
+    if _index is None:
+        _index = DocstringIndex()
+    return _index
+
+
+def get_docstrings(module_name: str) -> Dict[str, str]:
+    return get_docstring_index().get_docstrings(module_name)
+
+
+if __name__ == "__main__":
+    # Prebuilds the index for whole packages, e.g. `python -m askem_beaker.lib.docstring_index mira chirho`
+    for package_name in sys.argv[1:]:
+        get_docstring_index().index(package_name)
@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "onnx"
+DEFAULT_CACHE_DIR = "~/.cache/askem_beaker/embeddings"
+DEFAULT_MEMORY_CACHE_SIZE = 1024
+DEFAULT_BATCH_SIZE = 32
+
+
+def _onnx(model: Optional[str]):
+    # all-MiniLM-L6-v2 run on CPU with onnxruntime, the model the shipped indexes were built with
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+    function = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+    model_dir = os.environ.get("CHROMA_ONNX_MODEL_DIR", None)
+    if model_dir:
+        function.DOWNLOAD_PATH = Path(os.path.expanduser(model_dir))
+    # chromadb doesn't ship the model but downloads it the first time it embeds anything. Fetching it here means a
+    # failed download is noticed while another backend can still take over, rather than in the middle of a query.
+    function._download_model_if_not_exists()
+    return "all-MiniLM-L6-v2", function
+
+
+def _sentence_transformers(model: Optional[str]):
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    model = model or "all-MiniLM-L6-v2"
+    return model, SentenceTransformerEmbeddingFunction(model_name=model, device="cpu")
+
+
+def _openai(model: Optional[str]):
+    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+    model = model or "text-embedding-ada-002"
+    return model, OpenAIEmbeddingFunction(api_key=os.environ["OPENAI_API_KEY"], model_name=model)
+
+
+BACKENDS: Dict[str, Callable] = {
+    "onnx": _onnx,
+    "sentence-transformers": _sentence_transformers,
+    "openai": _openai,
+}
+
+# Backends to use when one can't be loaded. sentence-transformers runs the same all-MiniLM-L6-v2 model as onnx, so
+# its vectors still match the shipped indexes.
+FALLBACK_BACKENDS: Dict[str, str] = {
+    "onnx": "sentence-transformers",
+}
+
+
+class CachedEmbeddingFunction:
+    """
+    Chroma embedding function that wraps one of the `BACKENDS` with an in-memory LRU cache and a persistent SQLite
+    vector cache keyed by backend, model and text, and embeds cache misses in batches.
+
+    The backend is chosen with `CHROMA_EMBEDDING_BACKEND` (and `CHROMA_EMBEDDING_MODEL`). The default, `onnx`, runs
+    locally on the CPU and matches how the indexes in `resources/` were built; other backends need collections
+    embedded with the same model. Its model is not part of chromadb: it is downloaded to `CHROMA_ONNX_MODEL_DIR`
+    (chromadb's own cache by default) on first use, or ahead of time with `python -m askem_beaker.lib.embeddings`.
+    If it can't be loaded, the backend in `FALLBACK_BACKENDS` is used instead.
+    """
+
+    backend: str
+    model: str
+
+    def __init__(
+        self,
+        backend: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        backend = backend or os.environ.get("CHROMA_EMBEDDING_BACKEND", DEFAULT_BACKEND)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(BACKENDS)}")
+        model = model or os.environ.get("CHROMA_EMBEDDING_MODEL", None)
+        if cache_dir is None:
+            cache_dir = os.environ.get("CHROMA_EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        try:
+            self.model, self._function = BACKENDS[backend](model)
+        except Exception as e:
+            fallback = FALLBACK_BACKENDS.get(backend, None)
+            if fallback is None:
+                raise
+            logger.warning(f"Unable to load the {backend} embedding backend ({e}), falling back to {fallback}")
+            backend = fallback
+            self.model, self._function = BACKENDS[backend](model)
+        self.backend = backend
+        self.batch_size = batch_size or int(os.environ.get("CHROMA_EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.expanduser(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(cache_dir, "vectors.sqlite"), timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.backend}\0{self.model}\0{text}".encode()).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > DEFAULT_MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in input]
+        vectors: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            if missing:
+                placeholders = ", ".join("?" for _ in missing)
+                for key, blob in self._db.execute(f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", missing):
+                    vectors[key] = array("f", blob).tolist()
+                    self._remember(key, vectors[key])
+
+        to_embed = list(dict.fromkeys(text for text, key in zip(input, keys) if key not in vectors))
+        self.hits += len(input) - len(to_embed)
+        self.misses += len(to_embed)
+        for start in range(0, len(to_embed), self.batch_size):
+            batch = to_embed[start:start + self.batch_size]
+            embedded = [list(map(float, vector)) for vector in self._function(batch)]
+            rows = []
+            with self._lock:
+                for text, vector in zip(batch, embedded):
+                    key = self._key(text)
+                    vectors[key] = vector
+                    self._remember(key, vector)
+                    rows.append((key, array("f", vector).tobytes()))
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?)", rows)
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.backend, "model": self.model, "hits": self.hits, "misses": self.misses}
+
+
+def prefetch_onnx_model() -> str:
+    """
+    Downloads the `onnx` backend's model to `CHROMA_ONNX_MODEL_DIR` if it isn't there yet, returning where it is.
+    """
+    _, function = _onnx(None)
+    return str(function.DOWNLOAD_PATH)
+
+
+if __name__ == "__main__":
+    # e.g. `CHROMA_ONNX_MODEL_DIR=/home/jupyter/onnx_models python -m askem_beaker.lib.embeddings`
+    print(f"ONNX embedding model is in {prefetch_onnx_model()}", file=sys.stderr)
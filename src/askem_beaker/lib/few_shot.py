@@ -0,0 +1,43 @@
+import logging
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def latest_user_query(messages: Sequence[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message["role"] == "user":
+            return message["content"]
+    return ""
+
+
+class FewShotRetriever:
+    """
+    Retrieves few-shot examples once per user message.
+
+    `auto_context` runs on every step of the ReAct loop, but the examples only depend on what the user asked, so the
+    tool-using steps in between reuse the examples retrieved for the message they are answering.
+    """
+
+    def __init__(self, retrieve: Callable[[str], List[str]]) -> None:
+        self.retrieve = retrieve
+        self.query = ""
+        self.examples: List[str] = []
+        self.retrievals = 0
+        self.retrievals_avoided = 0
+
+    def examples_for(self, messages: Sequence[Dict[str, Any]]) -> Tuple[List[str], bool]:
+        """
+        Returns the examples for the latest user message in `messages`, and whether they were retrieved just now.
+        """
+        query = latest_user_query(messages)
+        if query == self.query:
+            self.retrievals_avoided += 1
+            return self.examples, False
+        self.examples = self.retrieve(query)
+        self.query = query
+        self.retrievals += 1
+        return self.examples, True
+
+    def stats(self) -> Dict[str, int]:
+        return {"retrievals": self.retrievals, "retrievals_avoided": self.retrievals_avoided}
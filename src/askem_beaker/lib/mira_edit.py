@@ -0,0 +1,260 @@
+import copy
+import logging
+import os
+import pickle
+import sys
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_LIMIT = 50
+
+# TemplateModel fields that hold the model's parts. Snapshots get their own copies of these containers but share the
+# objects in them.
+CONTAINERS = ("templates", "parameters", "initials", "observables")
+
+
+def shallow_copy(tm):
+    """
+    Copies a TemplateModel's containers without copying the templates, parameters, initials and observables in them.
+    """
+    update = {}
+    for field in CONTAINERS:
+        value = getattr(tm, field, None)
+        if isinstance(value, list):
+            update[field] = list(value)
+        elif isinstance(value, dict):
+            update[field] = dict(value)
+    if hasattr(tm, "model_copy"):
+        return tm.model_copy(update=update)
+    return tm.copy(update=update)
+
+
+def _size(obj: Any) -> int:
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(obj)
+
+
+class SnapshotStack:
+    """
+    Bounded undo/redo history of a TemplateModel being edited.
+
+    Snapshots are shallow copies that share their templates, parameters, initials and observables with the model and
+    with each other, so taking one costs a copy of the model's containers rather than a `copy.deepcopy`. For that to be
+    safe, edits that change one of those objects in place must first get a private copy of it from `writable`. Only
+    objects still shared with a snapshot are copied, at most once per checkpoint.
+
+    Undo and redo swap whole models between the stacks and never copy anything.
+    """
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        if limit is None:
+            limit = int(os.environ.get("MIRA_EDIT_HISTORY_LIMIT", DEFAULT_HISTORY_LIMIT))
+        self.limit = limit
+        self._undo: deque = deque(maxlen=limit)
+        self._redo: List[Any] = []
+        # Objects copied since the last checkpoint, which no snapshot refers to. They are kept alive so their ids
+        # can't be reused.
+        self._owned: Dict[int, Any] = {}
+        self._sizes: Dict[int, Tuple[Any, int]] = {}
+
+    def checkpoint(self, tm) -> None:
+        """
+        Records the current state of `tm` as an undo point, and drops anything that could have been redone.
+        """
+        if self.limit <= 0:
+            return
+        self._undo.append(shallow_copy(tm))
+        self._redo.clear()
+        self._owned.clear()
+
+    def undo(self, tm):
+        """
+        Returns the model as it was at the last checkpoint, keeping `tm` to be redone.
+        """
+        if not self._undo:
+            raise IndexError("There are no edits to undo.")
+        self._redo.append(tm)
+        self._owned.clear()
+        return self._undo.pop()
+
+    def redo(self, tm):
+        if not self._redo:
+            raise IndexError("There are no edits to redo.")
+        self._undo.append(tm)
+        self._owned.clear()
+        return self._redo.pop()
+
+    def rollback(self):
+        """
+        Discards the edits since the last checkpoint, returning the model as it was then. Nothing is kept to redo.
+        """
+        if not self._undo:
+            raise IndexError("There is no checkpoint to roll back to.")
+        self._owned.clear()
+        return self._undo.pop()
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+        self._owned.clear()
+        self._sizes.clear()
+
+    def writable(self, container, key):
+        """
+        Returns `container[key]` (a list or dict of the model being edited) ready to be changed in place, copying it
+        into the container first if a snapshot shares it.
+        """
+        obj = container[key]
+        if (not self._undo and not self._redo) or id(obj) in self._owned:
+            return obj
+        obj = copy.deepcopy(obj)
+        container[key] = obj
+        self._owned[id(obj)] = obj
+        return obj
+
+    def stats(self, tm=None) -> Dict[str, int]:
+        """
+        Reports the depth of the history and how much memory it holds. `bytes` counts every object a snapshot refers
+        to; `exclusive_bytes` only those that `tm`, the current model, doesn't share.
+        """
+        current = set()
+        if tm is not None:
+            for field in CONTAINERS:
+                current.update(id(obj) for obj in _values(getattr(tm, field, None)))
+        sizes = {}
+        for snapshot in (*self._undo, *self._redo):
+            for field in CONTAINERS:
+                for obj in _values(getattr(snapshot, field, None)):
+                    if id(obj) not in sizes:
+                        cached = self._sizes.get(id(obj))
+                        sizes[id(obj)] = cached if cached is not None else (obj, _size(obj))
+        self._sizes = sizes
+        return {
+            "undo": len(self._undo),
+            "redo": len(self._redo),
+            "limit": self.limit,
+            "objects": len(sizes),
+            "bytes": sum(size for _, size in sizes.values()),
+            "exclusive_bytes": sum(size for key, (_, size) in sizes.items() if key not in current),
+        }
+
+
+class TemplateIndex:
+    """
+    Index of a TemplateModel's templates by name, by the names of their concepts and by the parameters their rate laws
+    use, so edit procedures can find what they touch without scanning every template.
+
+    Templates are indexed by position. Procedures keep the index up to date as they edit (`appended`, `update`);
+    anything else that changes the model, like a notebook cell, must `invalidate` it. The index is also rebuilt
+    whenever it is asked about a different model object or one with a different number of templates.
+    """
+
+    def __init__(self) -> None:
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self.model = None
+        self.size = 0
+        self.concepts: Dict[str, Any] = {}
+        self._entries: List[Tuple[str, List[str], List[str]]] = []
+        self._by_name: Dict[str, Set[int]] = defaultdict(set)
+        self._by_concept: Dict[str, Set[int]] = defaultdict(set)
+        self._by_parameter: Dict[str, Set[int]] = defaultdict(set)
+
+    def of(self, tm) -> "TemplateIndex":
+        if tm is not self.model or len(tm.templates) != self.size:
+            self.invalidate()
+            self.model = tm
+            for position in range(len(tm.templates)):
+                self._add(position)
+            self.size = len(tm.templates)
+        return self
+
+    def _add(self, position: int) -> None:
+        template = self.model.templates[position]
+        concepts = template.get_concepts()
+        entry = (template.name, [concept.name for concept in concepts], list(template.get_parameter_names()))
+        if position == len(self._entries):
+            self._entries.append(entry)
+        else:
+            self._entries[position] = entry
+        self._by_name[entry[0]].add(position)
+        for concept in concepts:
+            self._by_concept[concept.name].add(position)
+            self.concepts[concept.name] = concept
+        for parameter in entry[2]:
+            self._by_parameter[parameter].add(position)
+
+    def _remove(self, position: int) -> None:
+        name, concept_names, parameter_names = self._entries[position]
+        for mapping, keys in ((self._by_name, [name]), (self._by_concept, concept_names), (self._by_parameter, parameter_names)):
+            for key in keys:
+                mapping[key].discard(position)
+                if not mapping[key]:
+                    del mapping[key]
+                    if mapping is self._by_concept:
+                        self.concepts.pop(key, None)
+
+    def update(self, tm, position: int) -> None:
+        """
+        Re-indexes the template at `position` after it was changed.
+        """
+        self.of(tm)
+        self._remove(position)
+        self._add(position)
+
+    def appended(self, tm) -> None:
+        """
+        Indexes the template added at the end of `tm`, which may be a new model object returned by `add_template`.
+        """
+        if self.model is not None and len(tm.templates) == self.size + 1:
+            self.model = tm
+            self.size += 1
+            self._add(self.size - 1)
+        else:
+            self.of(tm)
+
+    def templates_named(self, name: str) -> List[int]:
+        return sorted(self._by_name.get(name, ()))
+
+    def templates_with_concept(self, name: str) -> List[int]:
+        return sorted(self._by_concept.get(name, ()))
+
+    def templates_with_parameter(self, name: str) -> List[int]:
+        return sorted(self._by_parameter.get(name, ()))
+
+
+def _values(container) -> List[Any]:
+    if isinstance(container, dict):
+        return list(container.values())
+    if isinstance(container, list):
+        return container
+    return []
+
+
+_histories: Dict[str, SnapshotStack] = {}
+
+
+def get_history(var_name: str = "model") -> SnapshotStack:
+    """
+    Returns the edit history of the model held in `var_name`.
+    """
+    if var_name not in _histories:
+        _histories[var_name] = SnapshotStack()
+    return _histories[var_name]
+
+
+_indexes: Dict[str, TemplateIndex] = {}
+
+
+def get_template_index(var_name: str = "model") -> TemplateIndex:
+    """
+    Returns the template index of the model held in `var_name`.
+    """
+    if var_name not in _indexes:
+        _indexes[var_name] = TemplateIndex()
+    return _indexes[var_name]
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .mira_render import get_preview_renderer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.25
+DEFAULT_RENDER_TIMEOUT = 120.0
+DEFAULT_MAX_TEMPLATES = 2000
+RENDER_POLL_INTERVAL = 0.25
+
+
+def _hash(obj: Any) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def structural_hash(template_model) -> str:
+    """
+    Hash of the parts of a template model that change its graph: the templates (including their rate laws) and the
+    observables. Parameter values, initials and annotations are left out.
+    """
+    observables = {key: observable.dict() for key, observable in (template_model.observables or {}).items()}
+    return _hash({"templates": [template.dict() for template in template_model.templates], "observables": observables})
+
+
+def full_hash(template_model) -> str:
+    return _hash(template_model.dict())
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """
+    Returns RFC 6902 operations that turn `old` into `new`. Lists that change length are replaced whole, which keeps
+    the diff simple and is rare for the parameter-only changes this is used for.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        operations = []
+        for key in old:
+            if key not in new:
+                operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                operations.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                operations.extend(json_patch(old[key], value, f"{path}/{_escape(key)}"))
+        return operations
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        operations = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            operations.extend(json_patch(old_item, new_item, f"{path}/{index}"))
+        return operations
+    if old == new and type(old) == type(new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _to_amr(template_model, schema_name: str) -> Dict[str, Any]:
+    if schema_name == "regnet":
+        from mira.modeling.amr.regnet import template_model_to_regnet_json
+        return template_model_to_regnet_json(template_model)
+    elif schema_name == "stockflow":
+        from mira.modeling.amr.stockflow import template_model_to_stockflow_json
+        return template_model_to_stockflow_json(template_model)
+    else:
+        from mira.modeling.amr.petrinet import template_model_to_petrinet_json
+        return template_model_to_petrinet_json(template_model)
+
+
+class PreviewState:
+    """
+    What was last sent as the preview of a model, so the next preview can be skipped or sent as a patch.
+    """
+
+    structural_hash: Optional[str]
+    full_hash: Optional[str]
+    amr: Optional[Dict[str, Any]]
+
+    def __init__(self) -> None:
+        self.structural_hash = None
+        self.full_hash = None
+        self.amr = None
+
+
+_states: Dict[str, PreviewState] = {}
+
+
+def model_preview(template_model, schema_name: str = "petrinet", key: str = "model", force: bool = False) -> Dict[str, Any]:
+    """
+    Builds the preview of a template model, doing only as much work as what changed since the last preview requires:
+
+    * `{"status": "unchanged"}` if the model is identical.
+    * `{"status": "patch", "patch": [...]}` with a JSON patch of the AMR if only parameters or other non-structural
+      values changed. The rendered graph doesn't depend on those, so it isn't redrawn.
+    * `{"status": "full", "preview": {...}, "image": {...}}` otherwise, or if `force` is set. The graph is rendered in
+      the background (see `mira_render.PreviewRenderer`), so the preview only includes the image if it was cached;
+      `image` has the render's `key` and `status` for fetching it once it is done.
+    * `{"status": "suppressed", "templates": n, "max_templates": m}` if the model has more than
+      `MIRA_PREVIEW_MAX_TEMPLATES` templates, where building the AMR alone would take too long.
+    """
+    state = _states.setdefault(key, PreviewState())
+    max_templates = int(os.environ.get("MIRA_PREVIEW_MAX_TEMPLATES", DEFAULT_MAX_TEMPLATES))
+    if len(template_model.templates) > max_templates:
+        # Forget the last preview, so the next one that fits is sent in full
+        _states[key] = PreviewState()
+        return {"status": "suppressed", "templates": len(template_model.templates), "max_templates": max_templates}
+
+    new_full_hash = full_hash(template_model)
+    if not force and new_full_hash == state.full_hash:
+        return {"status": "unchanged"}
+
+    new_structural_hash = structural_hash(template_model)
+    amr = _to_amr(template_model, schema_name)
+    if not force and new_structural_hash == state.structural_hash and state.amr is not None:
+        patch = json_patch(state.amr, amr)
+        state.full_hash, state.amr = new_full_hash, amr
+        return {"status": "patch", "patch": patch}
+
+    preview = {"application/json": amr}
+    image = get_preview_renderer().submit(template_model)
+    if image["status"] == "done":
+        preview["image/png"] = image.pop("image/png")
+    state.structural_hash, state.full_hash, state.amr = new_structural_hash, new_full_hash, amr
+    return {"status": "full", "preview": preview, "image": image}
+
+
+class PreviewDebouncer:
+    """
+    Coalesces bursts of preview requests into one. Each call to `schedule` restarts a short timer and only the last
+    request in a burst runs `callback`, with the arguments it was scheduled with. Runs never overlap, and a run that
+    has started is never cancelled, so the preview state in the subkernel always matches what was sent.
+    """
+
+    delay: float
+
+    def __init__(self, callback: Callable[..., Awaitable[Any]], delay: Optional[float] = None) -> None:
+        if delay is None:
+            delay = float(os.environ.get("MIRA_PREVIEW_DEBOUNCE", DEFAULT_DEBOUNCE))
+        self.callback = callback
+        self.delay = delay
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    def schedule(self, **kwargs) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.delay, self._fire, kwargs)
+
+    def _fire(self, kwargs: Dict[str, Any]) -> None:
+        self._timer = None
+        asyncio.create_task(self._run(kwargs))
+
+    async def _run(self, kwargs: Dict[str, Any]) -> None:
+        async with self._lock:
+            try:
+                await self.callback(**kwargs)
+            except Exception:
+                logger.exception("Unable to send model preview")
+
+
+async def send_preview_image(context, key: str, parent_header={}, timeout: Optional[float] = None) -> None:
+    """
+    Waits for a background render started by `model_preview` and sends it to the client as a `model_preview_image`
+    message. The subkernel is polled rather than waited on so the user's cells keep running in the meantime.
+    """
+    if timeout is None:
+        timeout = float(os.environ.get("MIRA_PREVIEW_RENDER_TIMEOUT", DEFAULT_RENDER_TIMEOUT))
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(RENDER_POLL_INTERVAL)
+        result = (await context.evaluate(context.get_code("model_preview_image", {"key": key})))["return"]
+        if result["status"] == "done":
+            context.beaker_kernel.send_response(
+                "iopub", "model_preview_image", {"key": key, "image/png": result["image/png"]}, parent_header=parent_header
+            )
+            return
+        if result["status"] != "pending":
+            logger.error(f"Model preview render {key} failed: {result.get('error')}")
+            return
+    logger.error(f"Model preview render {key} timed out after {timeout}s")
@@ -0,0 +1,144 @@
+import base64
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "~/.cache/askem_beaker/previews"
+DEFAULT_MAX_NODES = 400
+DEFAULT_DOWNSCALE_NODES = 100
+DEFAULT_DOWNSCALE_DPI = 48
+MEMORY_CACHE_SIZE = 32
+
+
+def _render(dot_source: str, dpi: Optional[int] = None) -> bytes:
+    # Runs in the worker process, so it has to stay a top-level function.
+    import pygraphviz
+
+    graph = pygraphviz.AGraph(string=dot_source)
+    if dpi is not None:
+        graph.graph_attr["dpi"] = str(dpi)
+    return graph.draw(format="png", prog="dot")
+
+
+class PreviewRenderer:
+    """
+    Renders model preview graphs in a worker process so Graphviz layout never blocks the kernel.
+
+    Renders are cached by the sha256 of the graph's dot source, in memory and on disk, so any model with the same
+    structure is only laid out once. Graphs with more than `max_nodes` nodes aren't rendered at all and ones with
+    more than `downscale_nodes` are rendered at a lower resolution.
+    """
+
+    max_nodes: int
+    downscale_nodes: int
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_nodes: Optional[int] = None,
+        downscale_nodes: Optional[int] = None,
+    ) -> None:
+        if cache_dir is None:
+            cache_dir = os.environ.get("MIRA_PREVIEW_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_nodes is None:
+            max_nodes = int(os.environ.get("MIRA_PREVIEW_MAX_NODES", DEFAULT_MAX_NODES))
+        if downscale_nodes is None:
+            downscale_nodes = int(os.environ.get("MIRA_PREVIEW_DOWNSCALE_NODES", DEFAULT_DOWNSCALE_NODES))
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_nodes = max_nodes
+        self.downscale_nodes = downscale_nodes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._images: "OrderedDict[str, str]" = OrderedDict()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a kernel that is running threads isn't safe, so the worker is started fresh.
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _cached(self, key: str) -> Optional[str]:
+        if key in self._images:
+            self._images.move_to_end(key)
+            return self._images[key]
+        if os.path.exists(self._cache_path(key)):
+            with open(self._cache_path(key), "rb") as image_file:
+                return self._remember(key, image_file.read())
+        return None
+
+    def _remember(self, key: str, image: bytes) -> str:
+        encoded = base64.b64encode(image).decode("ascii")
+        self._images[key] = encoded
+        while len(self._images) > MEMORY_CACHE_SIZE:
+            self._images.popitem(last=False)
+        return encoded
+
+    def submit(self, template_model) -> Dict[str, Any]:
+        """
+        Starts rendering the graph of a template model, unless it is too large or already cached. Returns the render
+        `key` to pass to `result` and its `status`: "done" (with the image), "pending" or "skipped".
+        """
+        from mira.modeling.viz import GraphicalModel
+
+        graph = GraphicalModel.from_template_model(template_model).graph
+        dot_source = graph.string()
+        nodes = graph.number_of_nodes()
+        key = hashlib.sha256(dot_source.encode()).hexdigest()
+
+        if nodes > self.max_nodes:
+            return {"key": key, "status": "skipped", "nodes": nodes}
+        image = self._cached(key)
+        if image is not None:
+            return {"key": key, "status": "done", "nodes": nodes, "image/png": image}
+        if key not in self._pending:
+            dpi = DEFAULT_DOWNSCALE_DPI if nodes > self.downscale_nodes else None
+            self._pending[key] = self.executor.submit(_render, dot_source, dpi)
+        return {"key": key, "status": "pending", "nodes": nodes}
+
+    def result(self, key: str) -> Dict[str, Any]:
+        """
+        Returns the status of a render started by `submit`, with the base64 encoded png once it is done.
+        """
+        image = self._cached(key)
+        if image is not None:
+            return {"key": key, "status": "done", "image/png": image}
+        future = self._pending.get(key)
+        if future is None:
+            return {"key": key, "status": "failed", "error": "Unknown render"}
+        if not future.done():
+            return {"key": key, "status": "pending"}
+        del self._pending[key]
+        try:
+            image = future.result()
+        except Exception as e:
+            logger.exception("Unable to render model preview")
+            return {"key": key, "status": "failed", "error": str(e)}
+        tmp_path = f"{self._cache_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as image_file:
+            image_file.write(image)
+        os.replace(tmp_path, self._cache_path(key))
+        return {"key": key, "status": "done", "image/png": self._remember(key, image)}
+
+
+_renderer: Optional[PreviewRenderer] = None
+
+
+def get_preview_renderer() -> PreviewRenderer:
+    """
+    Returns the preview renderer shared by everything in this process.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = PreviewRenderer()
+    return _renderer
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TEMPLATES = 10000
+DEFAULT_PROGRESS_INTERVAL = 2.0
+
+
+def max_templates() -> int:
+    return int(os.environ.get("MIRA_STRATIFY_MAX_TEMPLATES", DEFAULT_MAX_TEMPLATES))
+
+
+def _controllers(template) -> list:
+    controllers = getattr(template, "controllers", None)
+    if controllers:
+        return list(controllers)
+    controller = getattr(template, "controller", None)
+    return [controller] if controller is not None else []
+
+
+def estimate_stratify(
+    template_model,
+    key: str,
+    strata: Iterable[Any],
+    structure: Optional[Iterable[Any]] = None,
+    directed: bool = False,
+    cartesian_control: bool = False,
+    concepts_to_stratify: Optional[Iterable[str]] = None,
+    params_to_stratify: Optional[Iterable[str]] = None,
+    concepts_to_preserve: Optional[Iterable[str]] = None,
+    params_to_preserve: Optional[Iterable[str]] = None,
+    **kwargs,
+) -> Dict[str, int]:
+    """
+    Estimates the number of templates, parameters and initials `mira.metamodel.ops.stratify` would produce with the
+    same arguments, without running it. The counts follow how stratify copies templates (once per stratum, and once
+    per combination of controller strata with `cartesian_control`) and adds a conversion between strata for each
+    stratified concept, so they are close but not exact.
+    """
+    strata_count = len(list(strata))
+    concept_names = {concept.name for template in template_model.templates for concept in template.get_concepts()}
+    stratified = concept_names if concepts_to_stratify is None else concept_names & set(concepts_to_stratify)
+    stratified = stratified - set(concepts_to_preserve or ())
+
+    templates = 0
+    for template in template_model.templates:
+        if not any(concept.name in stratified for concept in template.get_concepts()):
+            templates += 1
+            continue
+        copies = strata_count
+        if cartesian_control:
+            controllers = sum(1 for controller in _controllers(template) if controller.name in stratified)
+            copies *= strata_count ** controllers
+        templates += copies
+
+    if structure is None:
+        pairs = strata_count * (strata_count - 1) // 2
+        directed = False
+    else:
+        pairs = len(list(structure))
+    conversions = pairs * (1 if directed else 2) * len(stratified)
+    templates += conversions
+
+    parameter_names = set(template_model.parameters or {})
+    stratified_parameters = parameter_names if params_to_stratify is None else parameter_names & set(params_to_stratify)
+    stratified_parameters = stratified_parameters - set(params_to_preserve or ())
+    parameters = len(parameter_names) + len(stratified_parameters) * (strata_count - 1) + conversions
+
+    initials = 0
+    for initial in (template_model.initials or {}).values():
+        initials += strata_count if initial.concept.name in stratified else 1
+
+    return {
+        "strata": strata_count,
+        "templates": templates,
+        "parameters": parameters,
+        "initials": initials,
+    }
+
+
+def stratify_limit_error(estimate: Dict[str, int], limit: Optional[int] = None) -> Optional[str]:
+    """
+    Returns why a stratification of the estimated size is refused, or None if it is within `MIRA_STRATIFY_MAX_TEMPLATES`.
+    """
+    if limit is None:
+        limit = max_templates()
+    if estimate["templates"] <= limit:
+        return None
+    return (
+        f"Stratifying would produce about {estimate['templates']} templates, more than the limit of "
+        f"{limit} set by MIRA_STRATIFY_MAX_TEMPLATES"
+    )
+
+
+def check_stratify(template_model, **kwargs) -> Dict[str, int]:
+    """
+    Estimates a stratification like `estimate_stratify`, raising a ValueError if it would be too large. Used where the
+    model is only known when the stratification runs, like a step of a batch edit.
+    """
+    estimate = estimate_stratify(template_model, **kwargs)
+    error = stratify_limit_error(estimate)
+    if error is not None:
+        raise ValueError(error)
+    return estimate
+
+
+async def with_progress(
+    context, awaitable: Awaitable[Any], content: Dict[str, Any], parent_header={}, interval: Optional[float] = None
+) -> Any:
+    """
+    Awaits `awaitable` (e.g. the execution of a stratify cell), sending a `stratify_progress` message with `content`
+    and the time elapsed when it starts, every `interval` seconds while it runs, and when it is done.
+    """
+    if interval is None:
+        interval = float(os.environ.get("MIRA_STRATIFY_PROGRESS_INTERVAL", DEFAULT_PROGRESS_INTERVAL))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    def send(status: str) -> None:
+        context.beaker_kernel.send_response(
+            "iopub",
+            "stratify_progress",
+            {**content, "status": status, "elapsed": round(loop.time() - start, 1)},
+            parent_header=parent_header,
+        )
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            send("running")
+
+    send("started")
+    task = asyncio.create_task(heartbeat())
+    try:
+        return await awaitable
+    finally:
+        task.cancel()
+        send("done")
@@ -0,0 +1,217 @@
+import copy
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from .mira_preview import _hash
+
+logger = logging.getLogger(__name__)
+
+
+def _template_model(template_model, template):
+    from mira.metamodel import Annotations, TemplateModel
+    template = copy.deepcopy(template)
+    return TemplateModel(
+        templates=[template],
+        parameters={p: template_model.parameters[p] for p in template.get_parameter_names()},
+        initials={v: template_model.initials[v] for v in template.get_concept_names() if v in template_model.initials},
+        annotations=Annotations(name=f"{template.name}"),
+        observables={},
+        time=template_model.time,
+    )
+
+
+def _observable_model(template_model, name, observable, concepts):
+    from mira.metamodel import Annotations, StaticConcept, TemplateModel
+    return TemplateModel(
+        templates=[StaticConcept(subject=concepts[str(symbol)]) for symbol in observable.expression.free_symbols],
+        observables={name: observable},
+        time=template_model.time,
+        annotations=Annotations(name=name),
+    )
+
+
+def _dict(obj) -> Any:
+    return obj.dict() if obj is not None else None
+
+
+def _signature(template_model) -> tuple:
+    return (
+        tuple((template.name, template.type) for template in template_model.templates),
+        tuple(template_model.observables or ()),
+        len(template_model.parameters or ()),
+    )
+
+
+class TemplateCatalog:
+    """
+    The templates and observables of a TemplateModel, each as a model of its own, as sent by `amr_to_templates`.
+
+    Listing them only builds summaries. The AMR of each part, which means building a TemplateModel and a Petri net
+    for it, is made when it is asked for and cached by a hash of everything that goes into it: the template or
+    observable and the parameters, initials and time it uses. Parts that didn't change between edits are served from
+    the cache, and entries for parts that are no longer in the model are dropped whenever it is listed again.
+
+    The listing itself is kept until the catalog is asked about a different model object, the names of the model's
+    templates or observables change, or it is invalidated, which the contexts do after every cell and edit that could
+    have changed the model. Paging through a model hashes it once.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.model = None
+        self._signature = None
+        self._entries: List[Dict[str, Any]] = []
+        self._builders: List[Any] = []
+        self._amrs: Dict[str, Dict[str, Any]] = {}
+
+    def invalidate(self) -> None:
+        """
+        Forgets the listing, so the next `refresh` lists the model again. Cached AMRs are kept.
+        """
+        self.model = None
+
+    def refresh(self, template_model) -> List[Dict[str, Any]]:
+        """
+        Lists the parts of `template_model`, returning their summaries.
+        """
+        # Edits that change the model in place keep the same object, so a cheap signature guards the listing too
+        signature = _signature(template_model)
+        if template_model is self.model and signature == self._signature:
+            return self._entries
+        entries = []
+        builders = []
+        time = _dict(template_model.time)
+        for index, template in enumerate(template_model.templates):
+            parameters = list(template.get_parameter_names())
+            concepts = [concept.name for concept in template.get_concepts()]
+            key = _hash({
+                "template": template.dict(),
+                "parameters": {p: _dict(template_model.parameters.get(p)) for p in parameters},
+                "initials": {c: _dict(template_model.initials.get(c)) for c in concepts},
+                "time": time,
+            })
+            entries.append({
+                "index": index,
+                "kind": "template",
+                "name": template.name,
+                "type": template.type,
+                "concepts": concepts,
+                "parameters": parameters,
+                "hash": key,
+            })
+            builders.append(lambda template=template: _template_model(template_model, template))
+
+        concept_map = None
+        for name, observable in (template_model.observables or {}).items():
+            if concept_map is None:
+                concept_map = template_model.get_concepts_name_map()
+            symbols = sorted(str(symbol) for symbol in observable.expression.free_symbols)
+            key = _hash({
+                "observable": {name: observable.dict()},
+                "concepts": {s: _dict(concept_map.get(s)) for s in symbols},
+                "time": time,
+            })
+            entries.append({
+                "index": len(entries),
+                "kind": "observable",
+                "name": name,
+                "type": "Observable",
+                "concepts": symbols,
+                "parameters": [],
+                "hash": key,
+            })
+            builders.append(
+                lambda name=name, observable=observable: _observable_model(template_model, name, observable, concept_map)
+            )
+
+        current = {entry["hash"] for entry in entries}
+        self._amrs = {key: amr for key, amr in self._amrs.items() if key in current}
+        self._entries, self._builders = entries, builders
+        self.model, self._signature = template_model, signature
+        return entries
+
+    def page(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        end = None if limit is None else offset + limit
+        return self._entries[offset:end]
+
+    def amr(self, index: int) -> Dict[str, Any]:
+        """
+        Returns the AMR of part `index` of the model last listed.
+        """
+        from mira.modeling import Model
+        from mira.modeling.amr.petrinet import AMRPetriNetModel
+        key = self._entries[index]["hash"]
+        amr = self._amrs.get(key)
+        if amr is None:
+            self.misses += 1
+            amr = AMRPetriNetModel(Model(self._builders[index]())).to_json()
+            self._amrs[key] = amr
+        else:
+            self.hits += 1
+        return amr
+
+    def amrs(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.amr(index) for index in indices]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._amrs)}
+
+
+_catalogs: Dict[str, TemplateCatalog] = {}
+
+
+def get_template_catalog(var_name: str = "model") -> TemplateCatalog:
+    """
+    Returns the template catalog of the model held in `var_name`.
+    """
+    if var_name not in _catalogs:
+        _catalogs[var_name] = TemplateCatalog()
+    return _catalogs[var_name]
+
+
+def amr_to_templates(
+    template_model,
+    var_name: str = "model",
+    offset: int = 0,
+    limit: Optional[int] = None,
+    indices: Optional[Iterable[int]] = None,
+    include_amr: bool = True,
+) -> Dict[str, Any]:
+    """
+    Breaks `template_model` down into one model per template and observable.
+
+    Returns the `summaries` of the parts from `offset` (at most `limit` of them), or of the parts at `indices`, along
+    with the `total` number of parts. Unless `include_amr` is false, `templates` holds the AMR of each of those parts.
+    Arguments out of range are reported as `{"error": ...}` rather than raised.
+    """
+    catalog = get_template_catalog(var_name)
+    entries = catalog.refresh(template_model)
+    if offset < 0 or (limit is not None and limit < 0):
+        return {"error": f"offset and limit must not be negative (got offset={offset}, limit={limit})"}
+    if offset > len(entries):
+        return {"error": f"offset {offset} is past the end of the {len(entries)} templates and observables"}
+    if indices is not None:
+        indices = list(indices)
+        out_of_range = [index for index in indices if not 0 <= index < len(entries)]
+        if out_of_range:
+            return {"error": f"indices {out_of_range} are out of range for {len(entries)} templates and observables"}
+        summaries = [entries[index] for index in indices]
+    else:
+        summaries = catalog.page(offset, limit)
+    result = {
+        "total": len(entries),
+        "offset": offset,
+        "summaries": summaries,
+        "templates": catalog.amrs(entry["index"] for entry in summaries) if include_amr else [],
+    }
+    result["cache"] = catalog.stats()
+    return result
+
+
+def invalidate_template_catalogs() -> None:
+    """
+    Invalidates the catalog of every model, e.g. after a cell that may have changed any of them.
+    """
+    for catalog in _catalogs.values():
+        catalog.invalidate()
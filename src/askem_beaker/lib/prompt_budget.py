@@ -0,0 +1,114 @@
+import hashlib
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Used for models the installed tiktoken doesn't know about yet
+DEFAULT_ENCODING = "cl100k_base"
+TRUNCATION_MARKER = "\n[... truncated to fit the prompt]"
+
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+
+
+def get_encoding(model: str) -> "tiktoken.Encoding":
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            logger.info(f"No tiktoken encoding for {model}, falling back to {DEFAULT_ENCODING}")
+            _encodings[model] = tiktoken.get_encoding(DEFAULT_ENCODING)
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate(text: str, budget: int, model: str) -> str:
+    """
+    Cuts `text` down to at most `budget` tokens, marking where it was cut.
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    keep = max(budget - count_tokens(TRUNCATION_MARKER, model), 0)
+    return encoding.decode(tokens[:keep]) + TRUNCATION_MARKER
+
+
+def fit_lines(lines: Iterable[Tuple[str, Optional[str]]], budget: int, model: str, separator: str = "\n") -> str:
+    """
+    Joins `(line, summary)` pairs in order, using each full line while it fits in `budget` tokens and its summary
+    (if any) once it doesn't. Lines that don't fit either way are counted at the end rather than included.
+    """
+    included = []
+    omitted = 0
+    used = 0
+    separator_tokens = count_tokens(separator, model)
+    for line, summary in lines:
+        for candidate in (line, summary):
+            if candidate is None:
+                continue
+            tokens = count_tokens(candidate, model) + separator_tokens
+            if used + tokens <= budget:
+                included.append(candidate)
+                used += tokens
+                break
+        else:
+            omitted += 1
+    if omitted:
+        included.append(f"[... {omitted} more not shown]")
+    return separator.join(included)
+
+
+class PromptAssembler:
+    """
+    Builds a prompt out of named sections, each held to its own token budget.
+
+    Rendered sections are cached by a hash of their content and budget, so sections that didn't change between turns
+    are neither re-rendered nor re-tokenized.
+    """
+
+    def __init__(self, model: str, budgets: Dict[str, int]) -> None:
+        self.model = model
+        self.budgets = budgets
+        self.hits = 0
+        self.misses = 0
+        self.token_counts: Dict[str, int] = {}
+        self._sections: Dict[str, Tuple[str, str]] = {}
+
+    def section(self, name: str, content, render: Callable[[int], str]) -> str:
+        """
+        Returns section `name`, calling `render(budget)` only if `content` or the budget changed since the last call.
+        `content` is anything with a stable repr that the rendered text depends on.
+        """
+        budget = self.budgets[name]
+        key = hashlib.sha256(repr((content, budget)).encode()).hexdigest()
+        cached = self._sections.get(name)
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        text = render(budget)
+        self._sections[name] = (key, text)
+        self.token_counts[name] = count_tokens(text, self.model)
+        return text
+
+    def truncated(self, name: str, text: str) -> str:
+        return self.section(name, text, lambda budget: truncate(text, budget, self.model))
+
+    def lines(self, name: str, lines: Iterable[Tuple[str, Optional[str]]]) -> str:
+        lines = list(lines)
+        return self.section(name, lines, lambda budget: fit_lines(lines, budget, self.model))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "model": self.model,
+            "budgets": self.budgets,
+            "tokens": self.token_counts,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,160 @@
+import contextlib
+import importlib
+import inspect
+import io
+import logging
+import os
+import pydoc
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from .docs import package_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 512
+
+HELP = "help"
+SOURCE = "source"
+
+
+class Lookup(NamedTuple):
+    text: Optional[str]
+    error: Optional[str] = None
+
+    @property
+    def found(self) -> bool:
+        return self.error is None
+
+
+def _version(name: str) -> str:
+    try:
+        return package_version(name.split(".")[0])
+    except ImportError:
+        return "missing"
+
+
+def _resolve(name: str):
+    # Names can be modules themselves (e.g. "mira"), or attributes of a module
+    try:
+        module = importlib.import_module(name)
+        return module, module
+    except ImportError:
+        if "." not in name:
+            raise
+    module_path, object_name = name.rsplit(".", 1)
+    module = importlib.import_module(module_path)
+    obj = pydoc.locate(name)
+    if obj is None:
+        raise LookupError(f"{module_path} has no attribute {object_name}")
+    return module, obj
+
+
+def _help_text(name: str) -> str:
+    _resolve(name)
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        help(name)
+        return buf.getvalue()
+
+
+def _source_code(name: str) -> str:
+    module, obj = _resolve(name)
+    try:
+        return inspect.getsource(obj)
+    except TypeError:
+        # Instances and other objects without source of their own fall back to the module they live in
+        return inspect.getsource(module)
+
+
+RESOLVERS = {
+    HELP: _help_text,
+    SOURCE: _source_code,
+}
+
+
+class SymbolLookup:
+    """
+    Bounded LRU cache of `help()` and `inspect.getsource` output for fully qualified names, as served to the agents'
+    docstring and source code tools.
+
+    Entries are keyed by kind, name and the installed version of the name's top level package, so upgrading a library
+    never serves stale docs. Names that don't resolve are cached too, so the agent repeating a bad guess doesn't
+    re-import anything.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None) -> None:
+        if cache_size is None:
+            cache_size = int(os.environ.get("SYMBOL_LOOKUP_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._items: "OrderedDict[Tuple[str, str, str], Lookup]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: Tuple[str, str, str]) -> Optional[Lookup]:
+        with self._lock:
+            result = self._items.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            if not result.found:
+                self.negative_hits += 1
+            return result
+
+    def _put(self, key: Tuple[str, str, str], result: Lookup) -> None:
+        with self._lock:
+            self._items[key] = result
+            self._items.move_to_end(key)
+            while len(self._items) > self.cache_size:
+                self._items.popitem(last=False)
+
+    def lookup(self, kind: str, names: Iterable[str]) -> Dict[str, Lookup]:
+        """
+        Returns a `Lookup` for each distinct name, in the order given, resolving only the names not already cached.
+        """
+        resolver = RESOLVERS[kind]
+        results = {}
+        for name in dict.fromkeys(names):
+            key = (kind, name, _version(name))
+            result = self._get(key)
+            if result is None:
+                try:
+                    result = Lookup(resolver(name))
+                except Exception as e:
+                    logger.info(f"Unable to look up {name}: {e}")
+                    result = Lookup(None, f"{type(e).__name__}: {e}")
+                self._put(key, result)
+            results[name] = result
+        return results
+
+    def help_texts(self, names: Iterable[str]) -> Dict[str, Lookup]:
+        return self.lookup(HELP, names)
+
+    def source_code(self, names: Iterable[str]) -> Dict[str, Lookup]:
+        return self.lookup(SOURCE, names)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "size": len(self._items),
+            "max_size": self.cache_size,
+        }
+
+
+_lookup: Optional[SymbolLookup] = None
+
+
+def get_symbol_lookup() -> SymbolLookup:
+    """
+    Returns the symbol lookup cache shared by every agent in this process.
+    """
+    global _lookup
+    if _lookup is None:
+        _lookup = SymbolLookup()
+    return _lookup
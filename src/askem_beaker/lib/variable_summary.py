@@ -0,0 +1,179 @@
+import hashlib
+import reprlib
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_REPR = 1000
+DEFAULT_MAX_TOTAL = 20000
+# Builtin containers up to this size are fingerprinted by their full repr, larger ones by their bounded repr and length
+MAX_HASHED_ITEMS = 1000
+# Dataframes and arrays with more rows or elements than this are fingerprinted from an evenly spaced sample
+MAX_HASHED_ROWS = 100_000
+
+EXCLUDED_NAMES = {
+    "local_vars",
+    "open",
+    "quit",
+    "exit",
+    "In",
+    "Out",
+    "get_ipython",
+    "local_imported_modules",
+    "logger",
+    "__builtins__",
+}
+SIMPLE_TYPES = (type(None), bool, int, float, complex, str, bytes, list, tuple, set, frozenset, dict)
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 3
+_repr.maxdict = 20
+_repr.maxlist = 20
+_repr.maxtuple = 20
+_repr.maxset = 20
+_repr.maxstring = 200
+_repr.maxother = 200
+
+# Fingerprints of what was last reported, per namespace key
+_reported: Dict[str, Dict[str, Any]] = {}
+
+
+def _type_name(value: Any) -> str:
+    value_type = type(value)
+    if value_type.__module__ == "builtins":
+        return value_type.__qualname__
+    return f"{value_type.__module__}.{value_type.__qualname__}"
+
+
+def _shape(value: Any) -> Optional[List[int]]:
+    shape = getattr(value, "shape", None)
+    if shape is not None:
+        try:
+            return [int(dim) for dim in shape]
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, (list, tuple, set, frozenset, dict, str, bytes)):
+        return [len(value)]
+    return None
+
+
+def _content_digest(value: Any) -> Optional[str]:
+    """
+    Digest of an object's content, so objects changed in place (e.g. a TemplateModel being edited) are noticed.
+    Dataframes and arrays are hashed directly, from a sample if they are large; anything else by its full repr.
+    """
+    try:
+        pandas = sys.modules.get("pandas")
+        if pandas is not None and isinstance(value, (pandas.DataFrame, pandas.Series)):
+            sample = value if len(value) <= MAX_HASHED_ROWS else value.iloc[::len(value) // MAX_HASHED_ROWS]
+            return str(int(pandas.util.hash_pandas_object(sample, index=True).sum()))
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(value, numpy.ndarray) and value.dtype != object:
+            flat = value.ravel()
+            sample = flat if flat.size <= MAX_HASHED_ROWS else flat[::flat.size // MAX_HASHED_ROWS]
+            return hashlib.sha256(numpy.ascontiguousarray(sample).tobytes()).hexdigest()
+        return hashlib.sha256(repr(value).encode()).hexdigest()
+    except Exception:
+        return None
+
+
+def _fingerprint(value: Any, shape: Optional[List[int]]):
+    # Builtin values are compared by their bounded repr and shape, plus a digest of their full value where that is
+    # cheap, which catches in-place edits. The last item records whether the bounded repr was cut short. Anything else
+    # is compared by identity, type, shape and a digest of its content, so unchanged objects are never re-rendered.
+    if isinstance(value, SIMPLE_TYPES):
+        bounded = _repr.repr(value)
+        if isinstance(value, (str, bytes)):
+            digest, cut = hash(value), len(value) > _repr.maxstring
+        elif shape is None or shape[0] <= MAX_HASHED_ITEMS:
+            full = repr(value)
+            digest, cut = hashlib.sha256(full.encode()).hexdigest(), full != bounded
+        else:
+            digest, cut = None, True
+        return ("value", bounded, shape, digest, cut)
+    return (
+        "object",
+        id(value),
+        _type_name(value),
+        shape,
+        str(getattr(value, "dtypes", getattr(value, "dtype", ""))),
+        _content_digest(value),
+    )
+
+
+def _is_user_variable(name: str, value: Any) -> bool:
+    if name.startswith("_") or name in EXCLUDED_NAMES or callable(value):
+        return False
+    # Collections that look like a namespace (e.g. locals()) would drag whole modules into the summary
+    if isinstance(value, (dict, list)) and "__name__" in value:
+        return False
+    return True
+
+
+def summarize_variables(
+    namespace: Dict[str, Any],
+    key: str = "default",
+    full: bool = False,
+    max_repr: int = DEFAULT_MAX_REPR,
+    max_total: int = DEFAULT_MAX_TOTAL,
+) -> Dict[str, Any]:
+    """
+    Summarizes the user's variables in `namespace` as their type, shape and a repr truncated to `max_repr`
+    characters. Only variables that changed since the last summary for `key` are included (all of them if `full` is
+    set), along with the names of variables that were removed. Once the reprs add up to `max_total` characters the
+    remaining variables are reported without one.
+    """
+    reported = {} if full else _reported.get(key, {})
+    current = {}
+    changed = {}
+    imported_modules = []
+    total = 0
+    for name, value in list(namespace.items()):
+        if isinstance(value, types.ModuleType):
+            if not name.startswith("_") and name not in EXCLUDED_NAMES:
+                imported_modules.append(name)
+            continue
+        if not _is_user_variable(name, value):
+            continue
+        shape = _shape(value)
+        fingerprint = _fingerprint(value, shape)
+        current[name] = fingerprint
+        if reported.get(name) == fingerprint:
+            continue
+
+        summary = {"type": _type_name(value), "shape": shape, "repr": None, "truncated": False}
+        if total < max_total:
+            try:
+                value_repr = fingerprint[1] if fingerprint[0] == "value" else repr(value)
+            except Exception as e:
+                value_repr = f"<unable to repr: {e}>"
+            summary["truncated"] = len(value_repr) > max_repr or (fingerprint[0] == "value" and fingerprint[4])
+            summary["repr"] = value_repr[:max_repr]
+            total += len(summary["repr"])
+        else:
+            summary["truncated"] = True
+        changed[name] = summary
+
+    _reported[key] = current
+    return {
+        "changed": changed,
+        "removed": [name for name in reported if name not in current],
+        "imported_modules": imported_modules,
+    }
+
+
+def format_variable(name: str, summary: Dict[str, Any], with_repr: bool = True) -> str:
+    details = summary["type"]
+    if summary.get("shape") is not None:
+        details += f", shape {tuple(summary['shape'])}"
+    value_repr = summary.get("repr")
+    if value_repr is None or not with_repr:
+        return f"{name} ({details})"
+    return f"{name} ({details}) = {value_repr}{'...' if summary.get('truncated') else ''}"
+
+
+def format_variables(variables: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Formats variable summaries for a prompt, one variable per line.
+    """
+    return "\n".join(format_variable(name, summary) for name, summary in variables.items())
@@ -1,5 +1,7 @@
+import json
 import os
-from base64 import b64encode
+import zlib
+from base64 import b64decode, b64encode
 from typing import TYPE_CHECKING, Any, Dict
 from requests.auth import HTTPBasicAuth
 
@@ -30,3 +32,16 @@ def get_auth() -> TerariumAuth|None:
         return TerariumAuth()
     except ValueError:
         return None
+
+
+def encode_payload(obj: Any) -> str:
+    """
+    Packs a JSON serializable object into a compressed, base64 encoded string for passing values from a context into
+    its subkernel, where `decode_payload` unpacks it. This is far smaller, and faster for the subkernel to parse, than
+    rendering the object into procedure code as a literal.
+    """
+    return b64encode(zlib.compress(json.dumps(obj).encode("utf-8"))).decode("ascii")
+
+
+def decode_payload(payload: str) -> Any:
+    return json.loads(zlib.decompress(b64decode(payload)))
@@ -0,0 +1,111 @@
+from typing import Any, Dict, List
+
+import pytest
+
+pydantic = pytest.importorskip("pydantic")
+
+from askem_beaker.lib.mira_edit import SnapshotStack, shallow_copy
+
+
+class Part:
+    def __init__(self, name):
+        self.name = name
+
+
+class Model(pydantic.BaseModel):
+    templates: List[Any] = []
+    parameters: Dict[str, Any] = {}
+    initials: Dict[str, Any] = {}
+    observables: Dict[str, Any] = {}
+
+
+def make_model():
+    return Model(templates=[Part("t1"), Part("t2")], parameters={"beta": Part("beta")})
+
+
+def names(model):
+    return [template.name for template in model.templates]
+
+
+def test_shallow_copy_shares_parts_but_not_containers():
+    model = make_model()
+    copy = shallow_copy(model)
+    assert copy.templates is not model.templates
+    assert copy.templates[0] is model.templates[0]
+    copy.templates.append(Part("t3"))
+    assert names(model) == ["t1", "t2"]
+
+
+def test_undo_and_redo():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    history.checkpoint(model)
+    history.writable(model.templates, 0).name = "renamed"
+    assert names(model) == ["renamed", "t2"]
+
+    model = history.undo(model)
+    assert names(model) == ["t1", "t2"]
+    model = history.redo(model)
+    assert names(model) == ["renamed", "t2"]
+
+
+def test_writable_copies_shared_parts_once():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    original = model.templates[0]
+    history.checkpoint(model)
+    writable = history.writable(model.templates, 0)
+    assert writable is not original
+    assert history.writable(model.templates, 0) is writable
+
+
+def test_writable_without_history_edits_in_place():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    assert history.writable(model.templates, 0) is model.templates[0]
+
+
+def test_rollback_discards_edits_without_redo():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    history.checkpoint(model)
+    model.templates.append(Part("t3"))
+    model = history.rollback()
+    assert names(model) == ["t1", "t2"]
+    with pytest.raises(IndexError):
+        history.redo(model)
+
+
+def test_checkpoint_drops_redo():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    history.checkpoint(model)
+    model = history.undo(model)
+    history.checkpoint(model)
+    with pytest.raises(IndexError):
+        history.redo(model)
+
+
+def test_empty_history_raises():
+    history = SnapshotStack(limit=10)
+    with pytest.raises(IndexError):
+        history.undo(make_model())
+    with pytest.raises(IndexError):
+        history.rollback()
+
+
+def test_limit_bounds_undo_depth():
+    history = SnapshotStack(limit=2)
+    model = make_model()
+    for _ in range(3):
+        history.checkpoint(model)
+    assert history.stats(model)["undo"] == 2
+
+
+def test_clear_forgets_everything():
+    history = SnapshotStack(limit=10)
+    model = make_model()
+    history.checkpoint(model)
+    history.clear()
+    assert history.stats(model)["undo"] == 0
+    assert history.writable(model.templates, 0) is model.templates[0]
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from askem_beaker.lib.mira_stratify import check_stratify, estimate_stratify, stratify_limit_error
+
+S, I, R = (SimpleNamespace(name=name) for name in "SIR")
+
+
+def template(concepts, controller=None):
+    return SimpleNamespace(controller=controller, controllers=None, get_concepts=lambda: concepts)
+
+
+def make_model():
+    return SimpleNamespace(
+        templates=[template([S, I, I], controller=I), template([I, R])],
+        parameters={"beta": object(), "gamma": object()},
+        initials={"S": SimpleNamespace(concept=S), "I": SimpleNamespace(concept=I)},
+    )
+
+
+def test_estimate_stratify_everything():
+    estimate = estimate_stratify(make_model(), key="city", strata=["a", "b", "c"])
+    # 2 templates x 3 strata, plus 3 pairs of strata converted both ways for each of the 3 concepts
+    assert estimate == {"strata": 3, "templates": 6 + 18, "parameters": 2 + 2 * 2 + 18, "initials": 6}
+
+
+def test_cartesian_control_multiplies_controlled_templates():
+    plain = estimate_stratify(make_model(), key="city", strata=["a", "b"])
+    cartesian = estimate_stratify(make_model(), key="city", strata=["a", "b"], cartesian_control=True)
+    assert cartesian["templates"] - plain["templates"] == 2
+
+
+def test_structure_and_directed_limit_conversions():
+    estimate = estimate_stratify(make_model(), key="city", strata=["a", "b", "c"], structure=[["a", "b"]], directed=True)
+    assert estimate["templates"] == 6 + 3
+
+
+def test_preserved_concepts_and_parameters_are_not_stratified():
+    estimate = estimate_stratify(
+        make_model(), key="city", strata=["a", "b", "c"], concepts_to_preserve=["S", "I"], params_to_preserve=["beta"]
+    )
+    # Only the template with R is copied, and only R gets conversions
+    assert estimate == {"strata": 3, "templates": 1 + 3 + 6, "parameters": 2 + 2 + 6, "initials": 2}
+
+
+def test_concepts_to_stratify_limits_what_is_stratified():
+    estimate = estimate_stratify(make_model(), key="city", strata=["a", "b"], concepts_to_stratify=["R"])
+    assert estimate["templates"] == 1 + 2 + 2
+    assert estimate["initials"] == 2
+
+
+def test_limit(monkeypatch):
+    monkeypatch.setenv("MIRA_STRATIFY_MAX_TEMPLATES", "10")
+    assert stratify_limit_error({"templates": 10}) is None
+    assert "MIRA_STRATIFY_MAX_TEMPLATES" in stratify_limit_error({"templates": 11})
+    with pytest.raises(ValueError):
+        check_stratify(make_model(), key="city", strata=["a", "b", "c"])
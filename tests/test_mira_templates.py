@@ -0,0 +1,119 @@
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+from askem_beaker.lib import mira_templates
+from askem_beaker.lib.mira_templates import TemplateCatalog, amr_to_templates, invalidate_template_catalogs
+
+
+class Part:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def dict(self):
+        return dict(self.__dict__)
+
+
+class Template(Part):
+    def __init__(self, name, concepts, parameters):
+        super().__init__(name=name, type="NaturalConversion", concept_names=concepts, parameter_names=parameters)
+
+    def get_concepts(self):
+        return [SimpleNamespace(name=name) for name in self.concept_names]
+
+    def get_parameter_names(self):
+        return self.parameter_names
+
+
+def make_model():
+    return SimpleNamespace(
+        templates=[Template("infection", ["S", "I"], ["beta"]), Template("recovery", ["I", "R"], ["gamma"])],
+        parameters={"beta": Part(value=0.1), "gamma": Part(value=0.2)},
+        initials={},
+        observables={"infected": SimpleNamespace(expression=SimpleNamespace(free_symbols=["I"]), dict=lambda: {"I": 1})},
+        time=None,
+        get_concepts_name_map=lambda: {"S": Part(name="S"), "I": Part(name="I"), "R": Part(name="R")},
+    )
+
+
+@pytest.fixture
+def amrs(monkeypatch):
+    """
+    Stands in for mira's AMR conversion, recording which parts were converted.
+    """
+    built = []
+    modeling = types.ModuleType("mira.modeling")
+    modeling.Model = lambda part: part
+    petrinet = types.ModuleType("mira.modeling.amr.petrinet")
+    petrinet.AMRPetriNetModel = lambda part: SimpleNamespace(to_json=lambda: built.append(part) or {"name": part})
+    for name, module in [
+        ("mira", types.ModuleType("mira")),
+        ("mira.modeling", modeling),
+        ("mira.modeling.amr", types.ModuleType("mira.modeling.amr")),
+        ("mira.modeling.amr.petrinet", petrinet),
+    ]:
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(mira_templates, "_template_model", lambda model, template: template.name)
+    monkeypatch.setattr(mira_templates, "_observable_model", lambda model, name, observable, concepts: name)
+    monkeypatch.setattr(mira_templates, "_catalogs", {})
+    return built
+
+
+def names(result):
+    return [summary["name"] for summary in result["summaries"]]
+
+
+def test_pages(amrs):
+    model = make_model()
+    first = amr_to_templates(model, limit=2, include_amr=False)
+    assert first["total"] == 3
+    assert names(first) == ["infection", "recovery"]
+    assert first["templates"] == []
+    assert amrs == []
+
+    second = amr_to_templates(model, offset=2, limit=2)
+    assert names(second) == ["infected"]
+    assert second["summaries"][0]["kind"] == "observable"
+    assert second["templates"] == [{"name": "infected"}]
+
+
+def test_indices(amrs):
+    result = amr_to_templates(make_model(), indices=[1])
+    assert names(result) == ["recovery"]
+    assert result["templates"] == [{"name": "recovery"}]
+
+
+@pytest.mark.parametrize("arguments", [{"offset": -1}, {"limit": -1}, {"offset": 4}, {"indices": [3]}, {"indices": [-1]}])
+def test_out_of_range_arguments_are_errors(amrs, arguments):
+    assert "error" in amr_to_templates(make_model(), **arguments)
+
+
+def test_amrs_are_cached_until_their_part_changes(amrs):
+    model = make_model()
+    amr_to_templates(model)
+    assert amrs == ["infection", "recovery", "infected"]
+
+    model.parameters["gamma"] = Part(value=0.3)
+    invalidate_template_catalogs()
+    amr_to_templates(model)
+    assert amrs[3:] == ["recovery"]
+
+
+def test_renaming_in_place_is_listed(amrs):
+    model = make_model()
+    amr_to_templates(model, include_amr=False)
+    model.templates[0].name = "exposure"
+    result = amr_to_templates(model)
+    assert names(result)[0] == "exposure"
+    assert result["templates"][0] == {"name": "exposure"}
+
+
+def test_listing_is_reused_between_pages(amrs):
+    model = make_model()
+    catalog = TemplateCatalog()
+    entries = catalog.refresh(model)
+    assert catalog.refresh(model) is entries
+    catalog.invalidate()
+    assert catalog.refresh(model) is not entries
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from askem_beaker.lib.mira_edit import TemplateIndex
+
+
+class Template:
+    def __init__(self, name, concepts, parameters):
+        self.name = name
+        self.concepts = [SimpleNamespace(name=concept) for concept in concepts]
+        self.parameters = parameters
+
+    def get_concepts(self):
+        return self.concepts
+
+    def get_parameter_names(self):
+        return set(self.parameters)
+
+
+def make_model():
+    return SimpleNamespace(templates=[
+        Template("infection", ["S", "I"], ["beta"]),
+        Template("recovery", ["I", "R"], ["gamma"]),
+    ])
+
+
+def test_lookups():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    assert index.templates_named("recovery") == [1]
+    assert index.templates_with_concept("I") == [0, 1]
+    assert index.templates_with_parameter("beta") == [0]
+    assert index.templates_named("missing") == []
+    assert set(index.concepts) == {"S", "I", "R"}
+
+
+def test_update_reindexes_one_template():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    model.templates[1] = Template("recovery", ["I", "D"], ["delta"])
+    index.update(model, 1)
+    assert index.templates_with_concept("R") == []
+    assert "R" not in index.concepts
+    assert index.templates_with_concept("D") == [1]
+    assert index.templates_with_parameter("gamma") == []
+    assert index.templates_with_parameter("delta") == [1]
+
+
+def test_appended_indexes_the_new_template():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    model.templates.append(Template("death", ["I", "D"], ["mu"]))
+    index.appended(model)
+    assert index.templates_named("death") == [2]
+    assert index.templates_with_concept("I") == [0, 1, 2]
+
+
+def test_appended_to_a_new_model_object():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    new_model = SimpleNamespace(templates=model.templates + [Template("death", ["I", "D"], ["mu"])])
+    index.appended(new_model)
+    assert index.model is new_model
+    assert index.templates_named("death") == [2]
+
+
+def test_rebuilds_for_another_model_or_a_different_size():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    del model.templates[0]
+    assert index.of(model).templates_named("recovery") == [0]
+
+    other = SimpleNamespace(templates=[Template("vaccination", ["S", "V"], ["nu"])])
+    assert index.of(other).templates_named("vaccination") == [0]
+    assert index.templates_named("recovery") == []
+
+
+def test_invalidate_forces_a_rebuild():
+    model = make_model()
+    index = TemplateIndex().of(model)
+    model.templates[0] = Template("exposure", ["S", "E"], ["beta"])
+    index.invalidate()
+    assert index.of(model).templates_named("exposure") == [0]
+    assert index.templates_named("infection") == []
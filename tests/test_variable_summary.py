@@ -0,0 +1,71 @@
+import pytest
+
+from askem_beaker.lib.variable_summary import summarize_variables
+
+
+def test_reports_new_and_removed_variables():
+    namespace = {"x": 1, "y": "text"}
+    result = summarize_variables(namespace, key="new_and_removed")
+    assert set(result["changed"]) == {"x", "y"}
+
+    del namespace["y"]
+    result = summarize_variables(namespace, key="new_and_removed")
+    assert result["changed"] == {}
+    assert result["removed"] == ["y"]
+
+
+def test_unchanged_variables_are_not_reported_again():
+    namespace = {"x": list(range(100)), "y": {"a": 1}}
+    summarize_variables(namespace, key="unchanged")
+    assert summarize_variables(namespace, key="unchanged")["changed"] == {}
+
+
+def test_appending_to_a_long_list_is_reported():
+    namespace = {"x": list(range(100))}
+    summarize_variables(namespace, key="append")
+    namespace["x"].append(1)
+    result = summarize_variables(namespace, key="append")
+    assert result["changed"]["x"]["shape"] == [101]
+
+
+def test_editing_past_the_repr_cutoff_is_reported():
+    namespace = {"x": list(range(100))}
+    summarize_variables(namespace, key="edit")
+    namespace["x"][50] = -1
+    assert "x" in summarize_variables(namespace, key="edit")["changed"]
+
+
+def test_bounded_repr_is_marked_truncated():
+    result = summarize_variables({"x": list(range(100)), "y": [1, 2]}, key="truncated")
+    assert result["changed"]["x"]["truncated"]
+    assert not result["changed"]["y"]["truncated"]
+
+
+def test_full_reports_everything():
+    namespace = {"x": 1}
+    summarize_variables(namespace, key="full")
+    assert set(summarize_variables(namespace, key="full", full=True)["changed"]) == {"x"}
+
+
+class Model:
+    def __init__(self, names):
+        self.names = names
+
+    def __repr__(self):
+        return f"Model({self.names!r})"
+
+
+def test_objects_changed_in_place_are_reported():
+    namespace = {"model": Model(["S", "I"])}
+    summarize_variables(namespace, key="in_place")
+    namespace["model"].names[0] = "susceptible"
+    result = summarize_variables(namespace, key="in_place")
+    assert "susceptible" in result["changed"]["model"]["repr"]
+
+
+def test_dataframes_changed_in_place_are_reported():
+    pd = pytest.importorskip("pandas")
+    namespace = {"df": pd.DataFrame({"a": [1, 2, 3]})}
+    summarize_variables(namespace, key="dataframe")
+    namespace["df"].loc[1, "a"] = 20
+    assert "df" in summarize_variables(namespace, key="dataframe")["changed"]